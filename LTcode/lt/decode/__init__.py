@@ -1,13 +1,31 @@
 #!/usr/bin/env python3
 import io
+import mmap
+import os
 import sys
 
-from struct import unpack, error
+from array import array
+from struct import calcsize, pack, unpack_from, error
 from random import random
 from collections import defaultdict
 
 from math import ceil
+import numpy as np
+
 from LTcode.lt import sampler
+
+BACKENDS = ('int', 'numpy')
+
+# Fraction of K more blocks to receive before retrying inactivation decoding
+INACTIVATION_RETRY = 0.05
+
+# Size of the '!III' block header: filesize, blocksize, blockseed
+HEADER_SIZE = 12
+
+# Decoder checkpoint format, see `LtDecoder.save_state`
+STATE_MAGIC = b'LTDS'
+STATE_VERSION = 1
+_STATE_HEADER = '<4sIBBB5xddQQQQQQQQ'
  
 # Check node in graph
 class CheckNode(object):
@@ -16,15 +34,131 @@ class CheckNode(object):
         self.check = check
         self.src_nodes = src_nodes
 
+def inactivation_decode(checks):
+    """Solves a stalled system of check nodes by inactivation decoding.
+
+    `checks` is a list of (nodes, payload) pairs, each payload being the
+    XOR of the source nodes in `nodes` (any type supporting ^). Peeling
+    continues as in Belief Propagation; whenever the ripple empties, a
+    source node is inactivated: it becomes an unknown column, tracked in
+    every check as a bit-packed int. Nodes of degree-two checks are
+    inactivated first, since that restarts the ripple at once. The
+    leftover checks then form a small dense system over GF(2) in the
+    inactive columns, solved by Gaussian elimination, after which the
+    peeling order is replayed to resolve every node. Returns
+    {node: payload}, or None if the checks do not determine every node.
+    """
+
+    nbrs = [set(nodes) for nodes, _ in checks]
+    vals = [payload for _, payload in checks]
+    syms = [0] * len(checks)
+    used = bytearray(len(checks))
+    node_checks = defaultdict(list)
+    for c, nodes in enumerate(nbrs):
+        for node in nodes:
+            node_checks[node].append(c)
+    unknown = set(node_checks)
+    if len(checks) < len(unknown):
+        return None
+    weight = {node: len(cs) for node, cs in node_checks.items()}
+    by_weight = sorted(unknown, key=weight.get)
+    ripple = [c for c, nodes in enumerate(nbrs) if len(nodes) == 1]
+    pairs = [c for c, nodes in enumerate(nbrs) if len(nodes) == 2]
+    order = []
+    inactive = []
+
+    def substitute(node, val, sym):
+        unknown.discard(node)
+        for c in node_checks.pop(node):
+            if node in nbrs[c]:
+                nbrs[c].remove(node)
+                vals[c] = vals[c] ^ val
+                syms[c] ^= sym
+                if len(nbrs[c]) == 1:
+                    ripple.append(c)
+                elif len(nbrs[c]) == 2:
+                    pairs.append(c)
+
+    while unknown:
+        while ripple:
+            c = ripple.pop()
+            if used[c] or len(nbrs[c]) != 1:
+                continue
+            used[c] = 1
+            node = nbrs[c].pop()
+            order.append((node, c))
+            substitute(node, vals[c], syms[c])
+        if not unknown:
+            break
+
+        node = None
+        while pairs:
+            c = pairs.pop()
+            if not used[c] and len(nbrs[c]) == 2:
+                node = max(nbrs[c], key=weight.get)
+                break
+        if node is None:
+            while by_weight[-1] not in unknown:
+                by_weight.pop()
+            node = by_weight.pop()
+        substitute(node, 0, 1 << len(inactive))
+        inactive.append(node)
+
+    # Gaussian elimination on the unused checks, now only in the
+    # inactive columns; each pivot row's lowest bit is its column
+    pivots = {}
+    for c in range(len(checks)):
+        if len(pivots) == len(inactive):
+            break
+        if used[c]:
+            continue
+        sym, val = syms[c], vals[c]
+        while sym:
+            col = (sym & -sym).bit_length() - 1
+            if col not in pivots:
+                pivots[col] = (sym, val)
+                break
+            psym, pval = pivots[col]
+            sym ^= psym
+            val = val ^ pval
+    if len(pivots) < len(inactive):
+        return None
+
+    # Back substitution, highest column first
+    resolved = {}
+    for col in sorted(pivots, reverse=True):
+        sym, val = pivots[col]
+        sym ^= 1 << col
+        while sym:
+            b = (sym & -sym).bit_length() - 1
+            val = val ^ resolved[inactive[b]]
+            sym ^= 1 << b
+        resolved[inactive[col]] = val
+
+    # Replay the peeling: every other node of a pivot check was
+    # resolved or inactivated before the node it pivoted on
+    for node, c in order:
+        nodes, val = checks[c]
+        for other in nodes:
+            if other != node:
+                val = val ^ resolved[other]
+        resolved[node] = val
+    return resolved
+
 class BlockGraph(object):
     """Graph on which we run Belief Propagation to resolve 
     source node data
+
+    If `out` is given, each source node's bytes are written into it at
+    node * blocksize as soon as the node is resolved.
     """
     
-    def __init__(self, num_blocks):
+    def __init__(self, num_blocks, out=None, blocksize=0):
         self.checks = defaultdict(list)
         self.num_blocks = num_blocks
         self.eliminated = {}
+        self.out = out
+        self.blocksize = blocksize
 
     def add_block(self, nodes, data):
         """Adds a new check node and edges between that node and all
@@ -69,6 +203,7 @@ class BlockGraph(object):
 
         # Cache resolved value
         self.eliminated[node] = data
+        self._store(node, data)
         others = self.checks[node]
         del self.checks[node]
 
@@ -81,18 +216,325 @@ class BlockGraph(object):
             if len(check.src_nodes) == 1:
                 yield (next(iter(check.src_nodes)), check.check)
 
+    def is_resolved(self, node):
+        return node in self.eliminated
+
+    def restore(self, nodes):
+        """Marks `nodes` resolved, their bytes already being in `out`
+        """
+
+        bs = self.blocksize
+        for node in nodes:
+            self.eliminated[node] = int.from_bytes(self.out[node * bs:(node + 1) * bs], sys.byteorder)
+
+    def num_resolved(self):
+        return len(self.eliminated)
+
+    def _store(self, node, data):
+        if self.out is not None:
+            self.out[node * self.blocksize:(node + 1) * self.blocksize] = data.to_bytes(self.blocksize, sys.byteorder)
+
+    def residual(self):
+        """The pending (nodes, payload) checks Belief Propagation could
+        not resolve
+        """
+
+        checks = {}
+        for node_checks in self.checks.values():
+            for check in node_checks:
+                checks[id(check)] = check
+        return [(check.src_nodes, check.check) for check in checks.values()]
+
+    def solve(self):
+        """Resolves the pending checks by inactivation decoding, if they
+        determine every unresolved source node
+        """
+
+        resolved = inactivation_decode(self.residual())
+        if resolved is None or len(self.eliminated) + len(resolved) < self.num_blocks:
+            return False
+        self.eliminated.update(resolved)
+        for node, data in resolved.items():
+            self._store(node, data)
+        self.checks.clear()
+        return True
+
+class ArrayBlockGraph(object):
+    """Graph on which we run Belief Propagation, stored in flat arrays.
+
+    Check node `c` keeps its received payload in row `c` of a payload
+    matrix, its original source nodes in the CSR slice
+    `check_nodes[check_offsets[c]:check_offsets[c+1]]`, a counter of
+    unresolved source nodes and the XOR of their indices, which is the
+    remaining source node once the counter drops to one. Peeling with
+    a ripple queue therefore only touches integers; payloads of
+    resolved source nodes are computed afterwards, a whole wave of
+    independent nodes per NumPy gather and XOR reduction.
+
+    If `out` is given (num_blocks * blocksize bytes), decoded source
+    nodes land in it at node * blocksize: the payload matrix is a view
+    of `out` when blocksize is a multiple of 8, and each flushed wave
+    is copied into it otherwise.
+    """
+
+    def __init__(self, num_blocks, blocksize, out=None):
+        self.num_blocks = num_blocks
+        self.blocksize = blocksize
+        self.words = -(-blocksize // 8)
+
+        # Check nodes
+        self.check_data = bytearray()
+        self.check_nodes = array('q')
+        self.check_offsets = array('q', [0])
+        self.degree = []
+        self.xor_index = []
+
+        # Source nodes
+        self.adjacency = [[] for _ in range(num_blocks)]
+        self.resolved = bytearray(num_blocks)
+        self.solved_by = [0] * num_blocks
+        self.order = []
+        self.flushed = 0
+        self.wave_of = [-1] * num_blocks
+        self.out_rows = None
+        if out is None:
+            self.decoded = np.zeros((num_blocks, self.words), dtype=np.uint64)
+        elif blocksize % 8 == 0:
+            self.decoded = np.frombuffer(out, dtype=np.uint64).reshape(num_blocks, self.words)
+        else:
+            self.decoded = np.zeros((num_blocks, self.words), dtype=np.uint64)
+            self.out_rows = np.frombuffer(out, dtype=np.uint8).reshape(num_blocks, blocksize)
+
+    def add_block(self, nodes, data):
+        """Adds a new check node and edges between that node and all
+        unresolved source nodes it connects, resolving all source nodes
+        that become possible as a result.
+        """
+
+        c = len(self.degree)
+        self.check_data += data
+        if len(data) < self.words * 8:
+            self.check_data += bytes(self.words * 8 - len(data))
+        self.check_nodes.extend(nodes)
+        self.check_offsets.append(len(self.check_nodes))
+
+        resolved = self.resolved
+        remaining = [node for node in nodes if not resolved[node]]
+        index = 0
+        for node in remaining:
+            index ^= node
+        self.degree.append(len(remaining))
+        self.xor_index.append(index)
+
+        if len(remaining) == 1:
+            self._peel([c])
+        else:
+            for node in remaining:
+                self.adjacency[node].append(c)
+
+        # Are we done yet?
+        return len(self.order) >= self.num_blocks
+
+    def _peel(self, ripple):
+        """Resolves the remaining source node of every degree-one check
+        in the ripple, adding checks that drop to degree one as we go
+        """
+
+        degree = self.degree
+        xor_index = self.xor_index
+        adjacency = self.adjacency
+        while ripple:
+            c = ripple.pop()
+            if degree[c] != 1:
+                continue
+            node = xor_index[c]
+            degree[c] = 0
+            self.resolved[node] = 1
+            self.solved_by[node] = c
+            self.order.append(node)
+            for other in adjacency[node]:
+                degree[other] -= 1
+                xor_index[other] ^= node
+                if degree[other] == 1:
+                    ripple.append(other)
+            adjacency[node] = None
+
+    def flush(self):
+        """Computes the payloads of all source nodes resolved since the
+        last flush into `decoded`.
+
+        A node's payload is its solving check's payload XOR the payloads
+        of that check's other source nodes, all resolved before it. Nodes
+        are grouped into waves whose dependencies lie in earlier waves,
+        and each wave is computed with one gather and one reduceat. The
+        node's own row is still zero at that point, so whole neighbour
+        lists can be XORed without filtering it out.
+        """
+
+        pending = self.order[self.flushed:]
+        if not pending:
+            return
+        check_nodes = self.check_nodes
+        check_offsets = self.check_offsets
+        solved_by = self.solved_by
+        wave_of = self.wave_of
+        waves = []
+        for node in pending:
+            c = solved_by[node]
+            wave = 0
+            for other in check_nodes[check_offsets[c]:check_offsets[c + 1]]:
+                if wave_of[other] >= wave:
+                    wave = wave_of[other] + 1
+            wave_of[node] = wave
+            if wave == len(waves):
+                waves.append([])
+            waves[wave].append(node)
+        for node in pending:
+            wave_of[node] = -1
+
+        check_data = np.frombuffer(self.check_data, dtype=np.uint64).reshape(-1, self.words)
+        nodes_csr = np.frombuffer(check_nodes, dtype=np.int64)
+        offsets_csr = np.frombuffer(check_offsets, dtype=np.int64)
+        try:
+            for nodes in waves:
+                checks = np.array([solved_by[node] for node in nodes], dtype=np.int64)
+                starts = offsets_csr[checks]
+                degrees = offsets_csr[checks + 1] - starts
+                offsets = np.zeros(len(checks), dtype=np.int64)
+                np.cumsum(degrees[:-1], out=offsets[1:])
+                neighbours = nodes_csr[np.repeat(starts - offsets, degrees) + np.arange(degrees.sum())]
+                self.decoded[nodes] = check_data[checks] ^ np.bitwise_xor.reduceat(self.decoded[neighbours], offsets, axis=0)
+                self._store(nodes)
+        finally:
+            del check_data, nodes_csr, offsets_csr
+        self.flushed = len(self.order)
+
+    def residual(self):
+        """The pending (nodes, payload) checks Belief Propagation could
+        not resolve, payloads reduced by the already resolved nodes
+        """
+
+        self.flush()
+        checks = [c for c, d in enumerate(self.degree) if d > 1]
+        if not checks:
+            return []
+        check_data = np.frombuffer(self.check_data, dtype=np.uint64).reshape(-1, self.words)
+        nodes_csr = np.frombuffer(self.check_nodes, dtype=np.int64)
+        offsets_csr = np.frombuffer(self.check_offsets, dtype=np.int64)
+        try:
+            checks = np.array(checks, dtype=np.int64)
+            starts = offsets_csr[checks]
+            degrees = offsets_csr[checks + 1] - starts
+            offsets = np.zeros(len(checks), dtype=np.int64)
+            np.cumsum(degrees[:-1], out=offsets[1:])
+            neighbours = nodes_csr[np.repeat(starts - offsets, degrees) + np.arange(degrees.sum())]
+
+            # Reduce each check's payload by its resolved neighbours only
+            known = np.frombuffer(self.resolved, dtype=np.uint8)[neighbours].astype(bool)
+            counts = np.add.reduceat(known, offsets)
+            payloads = check_data[checks]
+            if known.any():
+                reducing = counts > 0
+                known_offsets = np.zeros(int(reducing.sum()), dtype=np.int64)
+                np.cumsum(counts[reducing][:-1], out=known_offsets[1:])
+                payloads[reducing] ^= np.bitwise_xor.reduceat(self.decoded[neighbours[known]], known_offsets, axis=0)
+        finally:
+            del check_data, nodes_csr, offsets_csr
+        # Hand payloads over as Python ints, which XOR faster than
+        # single NumPy rows
+        resolved = self.resolved
+        return [({node for node in neighbours[start:start + degree].tolist() if not resolved[node]},
+                 int.from_bytes(payload.tobytes(), sys.byteorder))
+                for start, degree, payload in zip(offsets.tolist(), degrees.tolist(), payloads)]
+
+    def solve(self):
+        """Resolves the pending checks by inactivation decoding, if they
+        determine every unresolved source node
+        """
+
+        resolved = inactivation_decode(self.residual())
+        if resolved is None or len(self.order) + len(resolved) < self.num_blocks:
+            return False
+        for node, payload in resolved.items():
+            self.decoded[node] = np.frombuffer(payload.to_bytes(self.words * 8, sys.byteorder), dtype=np.uint64)
+            self.resolved[node] = 1
+            self.order.append(node)
+            self.adjacency[node] = None
+        self._store(list(resolved))
+        self.flushed = len(self.order)
+        self.degree = [0] * len(self.degree)
+        return True
+
+    def is_resolved(self, node):
+        return self.resolved[node] == 1
+
+    def restore(self, nodes):
+        """Marks `nodes` resolved, their bytes already being in `out`
+        """
+
+        self.flush()
+        for node in nodes:
+            self.resolved[node] = 1
+            self.order.append(node)
+            self.adjacency[node] = None
+        if self.out_rows is not None:
+            _block_rows(self.decoded, self.blocksize)[nodes] = self.out_rows[nodes]
+        self.flushed = len(self.order)
+
+    def num_resolved(self):
+        return len(self.order)
+
+    def _store(self, nodes):
+        if self.out_rows is not None:
+            self.out_rows[nodes] = _block_rows(self.decoded[nodes], self.blocksize)
+
+    def block_bytes(self):
+        """The (num_blocks, blocksize) byte matrix of decoded source nodes
+        """
+
+        self.flush()
+        return _block_rows(self.decoded, self.blocksize)
+
+def _block_rows(words, blocksize):
+    return words.view(np.uint8)[:, :blocksize]
+
 class LtDecoder(object):
 
-    def __init__(self, c=sampler.DEFAULT_C, delta=sampler.DEFAULT_DELTA):
+    def __init__(self, c=sampler.DEFAULT_C, delta=sampler.DEFAULT_DELTA, backend='int', inactivation=False,
+                 on_prefix=None):
+        """`inactivation` enables falling back to inactivation decoding
+        when Belief Propagation stalls: it is attempted every
+        INACTIVATION_RETRY * K blocks once more than K blocks have been
+        received, and by `decode` when the input runs out.
+
+        `on_prefix(offset, data)` is called whenever the decoded prefix
+        of the file grows, with the byte offset and a memoryview of the
+        newly contiguous bytes, so output can be consumed before the
+        whole file is decoded. The callback keeps its own position, so
+        `stream`, `astream` and `take_prefix` still see every byte.
+        """
+
+        if backend not in BACKENDS:
+            raise ValueError("Unknown decoder backend %r, expected one of %s" % (backend, BACKENDS))
+        self.backend = backend
+        self.inactivation = inactivation
         self.c = c
         self.delta = delta
         self.K = 0
         self.filesize = 0
         self.blocksize = 0
 
+        self.out = None
         self.block_graph = None
         self.prng = None
         self.initialized = False
+        self.received = 0
+        self.next_solve = 0
+        self.done = False
+        self.on_prefix = on_prefix
+        self.prefix = 0
+        self.notified = 0
+        self.ripple = 0
 
     def is_done(self):
         return self.done
@@ -102,19 +544,215 @@ class LtDecoder(object):
 
         # first time around, init things
         if not self.initialized:
-            self.filesize = filesize
-            self.blocksize = blocksize
-
-            self.K = ceil(filesize/blocksize)
-            self.block_graph = BlockGraph(self.K)
-            self.prng = sampler.PRNG(params=(self.K, self.delta, self.c))
-            self.initialized = True
+            # Decoded blocks are written straight into place
+            self._init_graph(filesize, blocksize, bytearray(ceil(filesize/blocksize) * blocksize))
+            self.next_solve = ceil(self.K * (1 + INACTIVATION_RETRY))
 
         # Run PRNG with given seed to figure out which blocks were XORed to make received data
         _, _, src_blocks = self.prng.get_src_blocks(seed=blockseed)
 
         # If BP is done, stop
+        resolved = self.block_graph.num_resolved()
         self.done = self._handle_block(src_blocks, block)
+        self.received += 1
+        if not self.done and self.inactivation and self.received >= self.next_solve:
+            self.solve()
+        self.ripple = self.block_graph.num_resolved() - resolved
+
+        if self.on_prefix is not None:
+            chunk, self.notified = self._prefix_from(self.notified)
+            if chunk is not None:
+                self.on_prefix(*chunk)
+        return self.done
+
+    def _init_graph(self, filesize, blocksize, out):
+        self.filesize = filesize
+        self.blocksize = blocksize
+        self.K = ceil(filesize/blocksize)
+        self.out = out
+        if self.backend == 'numpy':
+            self.block_graph = ArrayBlockGraph(self.K, blocksize, self.out)
+        else:
+            self.block_graph = BlockGraph(self.K, self.out, blocksize)
+        self.prng = sampler.PRNG(params=(self.K, self.delta, self.c))
+        self.done = False
+        self.initialized = True
+
+    def save_state(self, path):
+        """Checkpoints the decoder to `path`, so that a transfer can be
+        resumed with `load_state` without receiving the same blocks
+        again.
+
+        The file is a little-endian header followed by 8-byte aligned
+        sections: a bitmap of resolved source blocks, the pending check
+        nodes as CSR int64 offsets and neighbour arrays with one
+        blocksize payload row each, and the output buffer, aligned for
+        mmap so it is mapped back rather than read. Checks are saved
+        reduced by the resolved blocks. The file is written next to
+        `path` and renamed over it, so a crash never leaves a torn
+        checkpoint.
+        """
+
+        if self.initialized:
+            K, bs = self.K, self.blocksize
+            checks = self.block_graph.residual()
+            resolved = np.packbits(np.fromiter((self.block_graph.is_resolved(i) for i in range(K)),
+                                               dtype=bool, count=K))
+        else:
+            K, bs, checks, resolved = 0, 0, [], np.zeros(0, dtype=np.uint8)
+        nodes = [sorted(check_nodes) for check_nodes, _ in checks]
+        offsets = np.zeros(len(checks) + 1, dtype='<i8')
+        np.cumsum([len(n) for n in nodes], out=offsets[1:])
+
+        header_size = calcsize(_STATE_HEADER)
+        sections = [resolved.tobytes(), offsets.tobytes(),
+                    np.fromiter((node for n in nodes for node in n), dtype='<i8', count=int(offsets[-1])).tobytes(),
+                    b''.join(payload.to_bytes(bs, sys.byteorder) for _, payload in checks)]
+        position = header_size
+        for section in sections:
+            position += -position % 8 + len(section)
+        out_offset = position + -position % mmap.ALLOCATIONGRANULARITY
+
+        tmp = '%s.tmp%d' % (path, os.getpid())
+        with open(tmp, 'wb') as f:
+            f.write(pack(_STATE_HEADER, STATE_MAGIC, STATE_VERSION, BACKENDS.index(self.backend),
+                         self.inactivation, self.initialized, self.c, self.delta, self.filesize, bs,
+                         self.received, self.next_solve, max(self.prefix, self.notified), len(checks), int(offsets[-1]), out_offset))
+            for section in sections:
+                f.write(bytes(-f.tell() % 8))
+                f.write(section)
+            if self.initialized:
+                f.write(bytes(out_offset - f.tell()))
+                f.write(memoryview(self.out)[:K * bs])
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    @classmethod
+    def load_state(cls, path, on_prefix=None):
+        """Restores a decoder checkpointed with `save_state`. The output
+        buffer is a private (copy-on-write) mapping of the file.
+        """
+
+        with open(path, 'rb') as f:
+            header = f.read(calcsize(_STATE_HEADER))
+            (magic, version, backend, inactivation, initialized, c, delta, filesize, blocksize,
+             received, next_solve, prefix, num_checks, num_edges, out_offset) = unpack_from(_STATE_HEADER, header)
+            if magic != STATE_MAGIC:
+                raise ValueError("%s is not an LT decoder checkpoint" % path)
+            if version != STATE_VERSION:
+                raise ValueError("Unsupported LT decoder checkpoint version %d" % version)
+
+            decoder = cls(c, delta, backend=BACKENDS[backend], inactivation=bool(inactivation), on_prefix=on_prefix)
+            if not initialized:
+                return decoder
+            K = ceil(filesize/blocksize)
+            out = mmap.mmap(f.fileno(), K * blocksize, access=mmap.ACCESS_COPY, offset=out_offset)
+            state = np.memmap(f, dtype=np.uint8, mode='r', shape=(out_offset,))
+
+        def section(position, dtype, count):
+            position += -position % 8
+            return position + count * np.dtype(dtype).itemsize, np.frombuffer(state, dtype=dtype, count=count, offset=position)
+
+        position, resolved = section(len(header), np.uint8, -(-K // 8))
+        position, offsets = section(position, '<i8', num_checks + 1)
+        position, nodes = section(position, '<i8', num_edges)
+        position, payloads = section(position, np.uint8, num_checks * blocksize)
+
+        decoder._init_graph(filesize, blocksize, out)
+        decoder.block_graph.restore(np.flatnonzero(np.unpackbits(resolved, count=K)).tolist())
+        payloads = payloads.reshape(num_checks, blocksize)
+        offsets = offsets.tolist()
+        for c in range(num_checks):
+            decoder._handle_block(set(nodes[offsets[c]:offsets[c + 1]].tolist()), payloads[c].tobytes())
+        decoder.received = received
+        decoder.next_solve = next_solve
+        decoder.prefix = decoder.notified = prefix
+        decoder.done = decoder.block_graph.num_resolved() >= decoder.K
+        return decoder
+
+    def take_prefix(self):
+        """The (offset, data) bytes of the file that became contiguously
+        decoded since the last call, or None if the prefix has not grown
+        """
+
+        chunk, self.prefix = self._prefix_from(self.prefix)
+        return chunk
+
+    def _prefix_from(self, start):
+        """The (offset, data) bytes from block `start` to the end of the
+        contiguously decoded prefix, or None if it ends at `start`, and
+        the block the prefix ends at
+        """
+
+        if not self.initialized:
+            return None, start
+        end = start
+        while end < self.K and self.block_graph.is_resolved(end):
+            end += 1
+        if end == start:
+            return None, start
+        if self.backend == 'numpy':
+            self.block_graph.flush()
+        offset = start * self.blocksize
+        return (offset, memoryview(self.out)[offset:min(end * self.blocksize, self.filesize)]), end
+
+    def stats(self):
+        """Decoding progress: blocks received, source blocks recovered,
+        blocks in the contiguous decoded prefix, and the ripple, the
+        number of source blocks the last received block released
+        """
+
+        return {
+            'received': self.received,
+            'recovered': self.block_graph.num_resolved() if self.initialized else 0,
+            'prefix': max(self.prefix, self.notified),
+            'ripple': self.ripple,
+        }
+
+    def stream(self, lt_blocks):
+        """Consumes parsed blocks, yielding (offset, data) chunks of the
+        file as soon as they extend the decoded prefix. Stops once the
+        file is decoded; if the input runs out first, tries inactivation
+        decoding when enabled and yields what that recovers.
+        """
+
+        for lt_block in lt_blocks:
+            self.consume_block(lt_block)
+            chunk = self.take_prefix()
+            if chunk is not None:
+                yield chunk
+            if self.done:
+                return
+        yield from self._finish_stream()
+
+    async def astream(self, lt_blocks):
+        """Like `stream`, for an asynchronous iterable of parsed blocks
+        """
+
+        async for lt_block in lt_blocks:
+            self.consume_block(lt_block)
+            chunk = self.take_prefix()
+            if chunk is not None:
+                yield chunk
+            if self.done:
+                return
+        for chunk in self._finish_stream():
+            yield chunk
+
+    def _finish_stream(self):
+        if self.initialized and not self.done and self.inactivation:
+            self.solve()
+            chunk = self.take_prefix()
+            if chunk is not None:
+                yield chunk
+
+    def solve(self):
+        """Tries to finish a stalled decode by inactivation decoding
+        """
+
+        self.next_solve = self.received + max(1, ceil(self.K * INACTIVATION_RETRY))
+        self.done = self.block_graph.solve()
         return self.done
 
     def bytes_dump(self):
@@ -124,58 +762,84 @@ class LtDecoder(object):
 
     def stream_dump(self, out_stream):
 
-        # Iterate through blocks, stopping before padding junk
-        for ix, block_bytes in enumerate(map(lambda p: int.to_bytes(p[1], self.blocksize, sys.byteorder),
-                sorted(self.block_graph.eliminated.items(), key = lambda p:p[0]))):
-            if ix < self.K-1 or self.filesize % self.blocksize == 0:
-                out_stream.write(block_bytes)
-            else:
-                out_stream.write(block_bytes[:self.filesize%self.blocksize])
+        if self.backend == 'numpy':
+            self.block_graph.flush()
+
+        # Blocks are already in order in the output buffer; stop
+        # before the padding junk
+        out_stream.write(memoryview(self.out)[:self.filesize])
 
     def _handle_block(self, src_blocks, block):
         """What to do with new block: add check and pass
         messages in graph
         """
+        if self.backend == 'numpy':
+            if isinstance(block, int):
+                block = int.to_bytes(block, self.blocksize, sys.byteorder)
+        elif not isinstance(block, int):
+            block = int.from_bytes(block, sys.byteorder)
         return self.block_graph.add_block(src_blocks, block)
 
-def _read_header(stream):
+def _read_header(buffer, offset=0):
     """Read block header from network
     """
-    # header_bytes = stream.read(12)
-    header_bytes = stream[:12]
-    return unpack('!III', header_bytes)
+    return unpack_from('!III', buffer, offset)
 
-def _read_block(blocksize, stream):
-    """Read block data from network into integer type
+def _read_block(blocksize, buffer, offset=0):
+    """Read block data from network as a zero-copy view
     """
-    # blockdata = stream.read(blocksize)
-    blockdata = stream[-blocksize:]
-    return int.from_bytes(blockdata, sys.byteorder)
+    start = offset + HEADER_SIZE
+    return buffer[start:start + blocksize]
 
 def read_blocks(stream):
-    """Generate parsed blocks from input stream
+    """Generate parsed blocks from input stream of packets; payloads
+    are memoryview slices of the packets, never copied
     """
     for s in stream:
-        header = _read_header(s)
-        block  = _read_block(header[1], s)
+        view = memoryview(s).cast('B')
+        header = _read_header(view)
+        block  = _read_block(header[1], view)
+        yield (header, block)
+
+def read_buffer(buffer):
+    """Generate parsed blocks from a single receive buffer of
+    back-to-back packets, such as `encode.encode_batch` output;
+    payloads are memoryview slices of the buffer
+    """
+    view = memoryview(buffer).cast('B')
+    offset = 0
+    while offset < len(view):
+        header = _read_header(view, offset)
+        block  = _read_block(header[1], view, offset)
         yield (header, block)
+        offset += HEADER_SIZE + header[1]
 
 # TODO: NO validation here that the bytes consist of a *single* block
 def block_from_bytes(bts):
-    return next(read_blocks(io.BytesIO(bts)))
+    return next(read_buffer(bts))
     
 def decode(in_stream, out_stream, **kwargs):
     count = 0
     decoder = LtDecoder(**kwargs)
 
+    # A single buffer of packets is parsed in place
+    if isinstance(in_stream, (bytes, bytearray, memoryview, np.ndarray)):
+        lt_blocks = read_buffer(in_stream)
+    else:
+        lt_blocks = read_blocks(in_stream)
+
     # Begin forever loop
-    for lt_block in read_blocks(in_stream):
+    for lt_block in lt_blocks:
         decoder.consume_block(lt_block)
         count += 1
         if decoder.is_done():
             # print("Decoded after", count, "blocks.")
             break
-    
+
+    # Out of blocks: one last attempt at solving the stalled system
+    if decoder.initialized and not decoder.is_done() and decoder.inactivation:
+        decoder.solve()
+
     if decoder.is_done() == False:
         print("Cannot reconstruct!!")
         return
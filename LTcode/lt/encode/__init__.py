@@ -1,36 +1,249 @@
+import mmap
+import os
+import stat
 import sys
 from random import randint
 from struct import pack
 
+import numpy as np
+
 from LTcode.lt import sampler
 
-def _split_file(f, blocksize):
-    """Block file byte contents into blocksize chunks, padding last one if necessary
+BACKENDS = ('int', 'numpy')
+
+# Blocks sampled per bulk PRNG call by the 'numpy' encoder backend
+BULK_BLOCKS = 1024
+
+# Upper bound on source rows gathered at once when XORing in bulk
+XOR_CHUNK_BYTES = 1 << 18
+
+# Largest block size at which XORing gathered rows beats XORing
+# Python ints; `encode_batch` uses the 'int' engine above it
+NUMPY_MAX_BLOCKSIZE = 4096
+
+# Fewest encoded blocks still worth a level of the level-by-level XOR
+XOR_LEVEL_ROWS = 64
+
+# Files up to this size have every block converted to an integer once
+# by the 'int' encoder backend; larger ones convert blocks per XOR, so
+# the backend never holds more than this much of the file as ints
+INT_CACHE_BYTES = 1 << 23
+
+def _map_file(f):
+    """Zero-copy view of the rest of file `f`, memory-mapped when `f`
+    is a seekable regular file and read into memory otherwise (pipes,
+    sockets, in-memory streams)
+    """
+
+    try:
+        fileno = f.fileno()
+        if stat.S_ISREG(os.fstat(fileno).st_mode):
+            offset = f.tell()
+            if os.fstat(fileno).st_size <= offset:
+                return memoryview(b'')
+            return memoryview(mmap.mmap(fileno, 0, access=mmap.ACCESS_READ))[offset:]
+    except (AttributeError, OSError, ValueError):
+        pass
+    return memoryview(f.read())
+
+class FileBlocks(object):
+    """The file to encode, split into blocksize chunks with the last
+    one padded if necessary.
+
+    Blocks are read straight out of a memory-mapped file, so only the
+    partial last block is ever copied and the file never has to be
+    resident as Python objects. Indexing gives a block as an integer
+    for the 'int' backend, `view` as zero-copy bytes, and `rows` as
+    64-bit words for the 'numpy' backend. After `load_ints`, indexing
+    reads the integers from a list instead of converting each time.
+    """
+
+    def __init__(self, f, blocksize):
+        self.buffer = _map_file(f)
+        self.filesize = len(self.buffer)
+        self.blocksize = blocksize
+        self.K = -(-self.filesize // blocksize)
+
+        # Rows are zero-extended to a whole number of 64-bit words so
+        # that XORs always run word-wise
+        self.words = -(-blocksize // 8)
+        self.full_blocks = self.filesize // blocksize
+        self.full = np.frombuffer(self.buffer, dtype=np.uint8,
+                                  count=self.full_blocks * blocksize).reshape(self.full_blocks, blocksize)
+        self.last = bytes(self.buffer[self.full_blocks * blocksize:]).ljust(blocksize, b'0')
+        self.ints = None
+
+    def __len__(self):
+        return self.K
+
+    def load_ints(self):
+        """Converts every block to an integer once, holding the file in
+        memory as Python ints
+        """
+
+        self.ints = [self[ix] for ix in range(self.K)]
+
+    def __getitem__(self, ix):
+        if self.ints is not None:
+            return self.ints[ix]
+        if ix < self.full_blocks:
+            return int.from_bytes(self.buffer[ix * self.blocksize:(ix + 1) * self.blocksize], sys.byteorder)
+        return int.from_bytes(self.last, sys.byteorder)
+
+    def view(self, ix):
+        if ix < self.full_blocks:
+            return self.buffer[ix * self.blocksize:(ix + 1) * self.blocksize]
+        return self.last
+
+    def rows(self, indices):
+        """The blocks at `indices` as a (len(indices), words) uint64 array
+        """
+
+        if self.blocksize % 8 == 0 and self.full_blocks == self.K:
+            return self.full.view(np.uint64)[indices]
+
+        rows = np.zeros((len(indices), self.words), dtype=np.uint64)
+        rows_bytes = _block_bytes(rows, self.blocksize)
+        partial = indices >= self.full_blocks
+        rows_bytes[~partial] = self.full[indices[~partial]]
+        rows_bytes[partial] = np.frombuffer(self.last, dtype=np.uint8)
+        return rows
+
+def _block_bytes(words, blocksize):
+    """The blocksize-byte rows of a word array built like `FileBlocks.rows`
+    """
+
+    return words.view(np.uint8)[:, :blocksize]
+
+
+def _xor_rows(blocks, offsets, indices, out):
+    """Sets out[j] to the XOR of the source rows in the CSR slice
+    indices[offsets[j]:offsets[j+1]].
+
+    Encoded blocks are ordered by degree so that the ones still needing
+    a k-th source row always form a prefix. Each level gathers one
+    source row for each of them and XORs it in place, with at most
+    XOR_CHUNK_BYTES of rows gathered at a time. Once fewer than
+    XOR_LEVEL_ROWS blocks are left, their remaining rows are reduced
+    block by block instead.
     """
 
-    f_bytes = f.read()
-    blocks = [int.from_bytes(f_bytes[i:i+blocksize].ljust(blocksize, b'0'), sys.byteorder) 
-            for i in range(0, len(f_bytes), blocksize)]
-    return len(f_bytes), blocks
+    count = len(offsets) - 1
+    if count == 0:
+        return
+    degrees = np.diff(offsets)
+    order = np.argsort(-degrees, kind='stable')
+    starts = offsets[:-1][order]
+    degrees = degrees[order]
+    max_rows = max(1, XOR_CHUNK_BYTES // (blocks.words * 8))
+    acc = np.empty((min(count, max_rows), blocks.words), dtype=np.uint64)
+    for start in range(0, count, max_rows):
+        stop = min(start + max_rows, count)
+        chunk = acc[:stop - start]
+        chunk[...] = blocks.rows(indices[starts[start:stop]])
+
+        # Degrees are descending, so the blocks with more than k source
+        # rows are the first `active` of the chunk
+        descending = -degrees[start:stop]
+        k = 1
+        active = int(np.searchsorted(descending, -k))
+        while active >= XOR_LEVEL_ROWS:
+            rows = blocks.rows(indices[starts[start:start + active] + k])
+            np.bitwise_xor(chunk[:active], rows, out=chunk[:active])
+            k += 1
+            active = int(np.searchsorted(descending, -k))
+
+        for j in range(active):
+            first, last = starts[start + j] + k, starts[start + j] + degrees[start + j]
+            for piece in range(first, last, max_rows):
+                rows = blocks.rows(indices[piece:min(piece + max_rows, last)])
+                chunk[j] ^= np.bitwise_xor.reduce(rows, axis=0)
+        out[order[start:stop]] = chunk
+
+def packet_dtype(blocksize):
+    """NumPy record layout of one encoded block on the wire, matching
+    the '!III%ss' struct packed by `encoder`
+    """
 
+    return np.dtype([('filesize', '>u4'),
+                     ('blocksize', '>u4'),
+                     ('blockseed', '>u4'),
+                     ('data', np.uint8, (blocksize,))])
 
-def encoder(f, blocksize, seed=None, c=sampler.DEFAULT_C, delta=sampler.DEFAULT_DELTA, max_blocks=10000):
+def encode_batch(f, blocksize, seed, count, c=sampler.DEFAULT_C, delta=sampler.DEFAULT_DELTA):
+    """Generates the first `count` blocks of the stream `encoder`
+    would yield for the same arguments, all at once.
+
+    Blocks are written into one preallocated record array of
+    `packet_dtype(blocksize)`: the `filesize`, `blocksize` and
+    `blockseed` fields form the header array and `data` is the
+    (count, blocksize) payload matrix. `packets.tobytes()` is the
+    concatenation of the packed blocks, and `packets[i].tobytes()`
+    is the i-th one. Payloads are XORed as 64-bit rows for block sizes
+    up to NUMPY_MAX_BLOCKSIZE and as Python ints above it.
+    """
+
+    blocks = FileBlocks(f, blocksize)
+    filesize = blocks.filesize
+
+    K = len(blocks)
+    prng = sampler.PRNG(params=(K, delta, c))
+    prng.set_seed(seed)
+
+    packets = np.empty(count, dtype=packet_dtype(blocksize))
+    packets['filesize'] = filesize
+    packets['blocksize'] = blocksize
+
+    blockseeds, _, offsets, indices = prng.get_src_blocks_bulk(count)
+    packets['blockseed'] = blockseeds
+    if blocksize > NUMPY_MAX_BLOCKSIZE:
+        data = packets['data']
+        for j in range(count):
+            block_data = 0
+            for ix in indices[offsets[j]:offsets[j + 1]].tolist():
+                block_data ^= blocks[ix]
+            data[j] = np.frombuffer(int.to_bytes(block_data, blocksize, sys.byteorder), dtype=np.uint8)
+    elif blocksize % 8 == 0:
+        _xor_rows(blocks, offsets, indices, packets['data'].view(np.uint64))
+    else:
+        payloads = np.empty((count, blocks.words), dtype=np.uint64)
+        _xor_rows(blocks, offsets, indices, payloads)
+        packets['data'] = _block_bytes(payloads, blocksize)
+    return packets
+
+
+def encoder(f, blocksize, seed=None, c=sampler.DEFAULT_C, delta=sampler.DEFAULT_DELTA, max_blocks=10000, backend='int'):
     """Generates an infinite sequence of blocks to transmit
     to the receiver
+
+    `backend` selects how source blocks are combined: 'int' XORs
+    Python big integers, 'numpy' holds the file as one contiguous
+    array and XORs the sampled rows as 64-bit words, which is faster
+    for blocks up to a few KB.
     """
 
+    if backend not in BACKENDS:
+        raise ValueError("Unknown encoder backend %r, expected one of %s" % (backend, BACKENDS))
+
     # Generate seed if not provided
     if seed is None:
         seed = randint(0, 1 << 31 - 1)
 
     # get file blocks
-    filesize, blocks = _split_file(f, blocksize)
+    blocks = FileBlocks(f, blocksize)
+    filesize = blocks.filesize
 
     # init stream vars
     K = len(blocks)
     prng = sampler.PRNG(params=(K, delta, c))
     prng.set_seed(seed)
 
+    if backend == 'numpy':
+        yield from _bulk_encoder(filesize, blocksize, blocks, prng, max_blocks)
+        return
+    if filesize <= INT_CACHE_BYTES:
+        blocks.load_ints()
+
     i = 0
     # block generation loop
     while True:
@@ -46,3 +259,18 @@ def encoder(f, blocksize, seed=None, c=sampler.DEFAULT_C, delta=sampler.DEFAULT_
         block = (filesize, blocksize, blockseed, int.to_bytes(block_data, blocksize, sys.byteorder))
         i = i + 1
         yield pack('!III%ss'%blocksize, *block)
+
+def _bulk_encoder(filesize, blocksize, blocks, prng, max_blocks):
+    """Block generation loop of the 'numpy' backend: samples and XORs
+    BULK_BLOCKS blocks at a time, then yields them one by one
+    """
+
+    i = 0
+    while i != max_blocks:
+        n = BULK_BLOCKS if max_blocks is None else min(BULK_BLOCKS, max_blocks - i)
+        blockseeds, _, offsets, indices = prng.get_src_blocks_bulk(n)
+        payloads = np.empty((n, blocks.words), dtype=np.uint64)
+        _xor_rows(blocks, offsets, indices, payloads)
+        for blockseed, block_data in zip(blockseeds.tolist(), _block_bytes(payloads, blocksize)):
+            yield pack('!III%ss'%blocksize, filesize, blocksize, blockseed, block_data.tobytes())
+        i += n
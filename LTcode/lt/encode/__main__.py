@@ -23,13 +23,13 @@ import time
 
 from lt import encode, sampler
 
-def run(fn, blocksize, seed, c, delta):
+def run(fn, blocksize, seed, c, delta, backend='int'):
     """Run the encoder until the channel is broken, signalling that the 
     receiver has successfully reconstructed the file
     """
 
     with open(fn, 'rb') as f:
-        for block in encode.encoder(f, blocksize, seed, c, delta):
+        for block in encode.encoder(f, blocksize, seed, c, delta, backend=backend):
             sys.stdout.buffer.write(block)
             continue
 
@@ -51,6 +51,9 @@ if __name__ == '__main__':
                                  nargs="?",
                                  default=sampler.DEFAULT_DELTA,
                                  help='degree sampling distribution tuning parameter')
+    parser.add_argument('--backend', choices=encode.BACKENDS,
+                                     default='int',
+                                     help='block XOR engine used to build encoded blocks')
     args = parser.parse_args()
 
     if not os.path.exists(args.file):
@@ -58,7 +61,7 @@ if __name__ == '__main__':
         sys.exit(1)
     
     try:
-        run(args.file, args.blocksize, args.seed, args.c, args.delta)
+        run(args.file, args.blocksize, args.seed, args.c, args.delta, args.backend)
     except (GeneratorExit, IOError):
         print("Decoder has cut off transmission. Fountain closed.", file=sys.stderr)
         sys.stdout.write = lambda s:None
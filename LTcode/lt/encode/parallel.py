@@ -0,0 +1,148 @@
+"""Multi-process LT encoding.
+
+Every encoded block depends only on its seed and the source blocks, so
+once the seed sequence has been walked (cheap: no XORs) the blocks can
+be built independently. `ParallelEncoder` copies the source into shared
+memory once, samples the neighbour lists for a whole batch in the
+parent, shards the batch across a process pool, and has the workers
+XOR their blocks straight into a shared output buffer. The result is
+the exact stream `encoder` produces for the same arguments.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from random import randint
+
+import numpy as np
+
+from LTcode.lt import sampler
+from LTcode.lt.encode import FileBlocks, _block_bytes, _xor_rows, packet_dtype
+
+# Blocks sampled and sharded per round by `ParallelEncoder.encoder`
+PARALLEL_BATCH_BLOCKS = 1 << 14
+
+# Source rows copied into shared memory per step
+COPY_CHUNK_BLOCKS = 1 << 14
+
+class _WordBlocks(object):
+    """Source blocks already laid out as a (K, words) uint64 array, with
+    the interface `_xor_rows` expects from `FileBlocks`
+    """
+
+    def __init__(self, words):
+        self.array = words
+        self.words = words.shape[1]
+
+    def rows(self, indices):
+        return self.array[indices]
+
+def _attach(name, shape):
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=np.uint64, buffer=shm.buf)
+
+def _encode_shard(source_name, source_shape, out_name, out_shape, start, offsets, indices):
+    """Worker: XOR blocks start, ..., start+len(offsets)-2 into the
+    shared output buffer
+    """
+
+    source_shm, source = _attach(source_name, source_shape)
+    out_shm, out = _attach(out_name, out_shape)
+    try:
+        _xor_rows(_WordBlocks(source), offsets, indices, out[start:start + len(offsets) - 1])
+    finally:
+        del source, out
+        source_shm.close()
+        out_shm.close()
+
+class ParallelEncoder(object):
+    """Encodes a file across a pool of worker processes.
+
+    Successive calls to `encode_batch` continue the same stream, and
+    `encoder` yields it block by block like `encode.encoder`. Use as a
+    context manager, or call `close`, to release the pool and the
+    shared memory.
+    """
+
+    def __init__(self, f, blocksize, seed=None, c=sampler.DEFAULT_C, delta=sampler.DEFAULT_DELTA, workers=None):
+
+        # Generate seed if not provided
+        if seed is None:
+            seed = randint(0, 1 << 31 - 1)
+
+        blocks = FileBlocks(f, blocksize)
+        self.filesize = blocks.filesize
+        self.blocksize = blocksize
+        self.K = len(blocks)
+        self.prng = sampler.PRNG(params=(self.K, delta, c))
+        self.prng.set_seed(seed)
+
+        # Share the source as whole 64-bit words, copied over in chunks
+        # so a mapped file is never fully resident in this process
+        self.source_shape = (self.K, blocks.words)
+        self.source_shm = shared_memory.SharedMemory(create=True, size=max(1, self.K * blocks.words * 8))
+        source = np.ndarray(self.source_shape, dtype=np.uint64, buffer=self.source_shm.buf)
+        for start in range(0, self.K, COPY_CHUNK_BLOCKS):
+            source[start:start + COPY_CHUNK_BLOCKS] = blocks.rows(np.arange(start, min(start + COPY_CHUNK_BLOCKS, self.K)))
+        del source
+
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = ProcessPoolExecutor(self.workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.pool.shutdown()
+        self.source_shm.close()
+        self.source_shm.unlink()
+
+    def encode_batch(self, count):
+        """The next `count` blocks of the stream as a record array of
+        `packet_dtype(blocksize)`, like `encode.encode_batch`
+        """
+
+        packets = np.empty(count, dtype=packet_dtype(self.blocksize))
+        packets['filesize'] = self.filesize
+        packets['blocksize'] = self.blocksize
+
+        blockseeds, _, offsets, indices = self.prng.get_src_blocks_bulk(count)
+        packets['blockseed'] = blockseeds
+
+        # Shard by XOR work (edges) rather than by block count, since
+        # degrees vary by orders of magnitude
+        cuts = np.searchsorted(offsets, np.linspace(0, offsets[-1], self.workers + 1)[1:-1])
+        bounds = [0] + sorted(set(cuts.tolist()) - {0, count}) + [count]
+
+        out_shape = (count, self.source_shape[1])
+        out_shm = shared_memory.SharedMemory(create=True, size=max(1, count * out_shape[1] * 8))
+        try:
+            futures = [self.pool.submit(_encode_shard, self.source_shm.name, self.source_shape,
+                                        out_shm.name, out_shape, start,
+                                        offsets[start:stop + 1] - offsets[start],
+                                        indices[offsets[start]:offsets[stop]])
+                       for start, stop in zip(bounds, bounds[1:])]
+            for future in futures:
+                future.result()
+
+            out = np.ndarray(out_shape, dtype=np.uint64, buffer=out_shm.buf)
+            packets['data'] = _block_bytes(out, self.blocksize)
+            del out
+        finally:
+            out_shm.close()
+            out_shm.unlink()
+        return packets
+
+    def encoder(self, max_blocks=10000):
+        """Generates the packed blocks of the stream, encoding
+        PARALLEL_BATCH_BLOCKS at a time
+        """
+
+        i = 0
+        while i != max_blocks:
+            n = PARALLEL_BATCH_BLOCKS if max_blocks is None else min(PARALLEL_BATCH_BLOCKS, max_blocks - i)
+            for packet in self.encode_batch(n):
+                yield packet.tobytes()
+            i += n
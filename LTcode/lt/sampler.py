@@ -12,8 +12,13 @@ sampled is transmitted with the block as metadata, so the
 receiver can reconstruct the sampling of source blocks given the
 same PRNG parameters below.
 """
+from bisect import bisect_right
+from functools import lru_cache
+from itertools import accumulate
 from math import log, floor, sqrt
 
+import numpy as np
+
 DEFAULT_C = 0.1
 DEFAULT_DELTA = 0.5
 
@@ -22,6 +27,9 @@ PRNG_A = 16807
 PRNG_M = (1 << 31) - 1
 PRNG_MAX_RAND = PRNG_M - 1
 
+# Number of (K, delta, c) degree CDFs kept alive for reuse
+RSD_CDF_CACHE_SIZE = 8
+
 def gen_tau(S, K, delta):
     """The Robust part of the RSD, we precompute an
     array for speed
@@ -48,12 +56,30 @@ def gen_mu(K, delta, c):
     normalizer = sum(rho) + sum(tau)
     return [(rho[d] + tau[d])/normalizer for d in range(K)]
 
+@lru_cache(maxsize=RSD_CDF_CACHE_SIZE)
 def gen_rsd_cdf(K, delta, c):
     """The CDF of the RSD on block degree, precomputed for
-    sampling speed"""
+    sampling speed. Built with a running sum in O(K) and shared
+    between every PRNG (encoder and decoder) with the same
+    parameters, so the result is an immutable tuple"""
 
     mu = gen_mu(K, delta, c)
-    return [sum(mu[:d+1]) for d in range(K)]
+    return tuple(accumulate(mu))
+
+
+def gen_lehmer_stream(state, n):
+    """The `n` PRNG states following `state`, as a uint64 array.
+
+    Computed by doubling: the second half of a prefix of length m is
+    the first half scaled by A^m mod M, so only O(log n) vectorized
+    steps are needed. All products stay below 2^62.
+    """
+
+    stream = np.array([PRNG_A * state % PRNG_M], dtype=np.uint64)
+    while len(stream) < n:
+        jump = np.uint64(pow(PRNG_A, len(stream), PRNG_M))
+        stream = np.concatenate((stream, stream * jump % np.uint64(PRNG_M)))
+    return stream[:n]
 
 
 class PRNG(object):
@@ -84,11 +110,10 @@ class PRNG(object):
         distributions above and the linear PRNG output
         """
 
+        # The CDF is non-decreasing, so the first bucket with v > p is
+        # found by binary search; p past the last bucket maps to degree K
         p = self._get_next() / PRNG_MAX_RAND
-        for ix, v in enumerate(self.cdf):
-            if v > p:
-                return ix + 1
-        return ix + 1
+        return min(bisect_right(self.cdf, p), self.K - 1) + 1
 
     def set_seed(self, seed):
         """Reset the state of the PRNG to the 
@@ -118,3 +143,89 @@ class PRNG(object):
                 have += 1
         return blockseed, d, nums
 
+    def get_src_blocks_bulk(self, count, seed=None):
+        """Samples the next `count` blocks at once, leaving the PRNG in
+        the same state as `count` calls to `get_src_blocks` would.
+
+        Returns `(blockseeds, degrees, offsets, indices)` as NumPy
+        arrays, the neighbours of block j being the CSR slice
+        `indices[offsets[j]:offsets[j+1]]` in sampling order.
+        """
+
+        if seed:
+            self.state = seed
+
+        # Size the raw stream from the mean degree, growing it in the
+        # rare case the walk runs off the end
+        cdf = np.asarray(self.cdf)
+        mean_d = 1 + float(np.sum(1 - cdf[:-1]))
+        n = int(count * (2 + mean_d) * 1.1) + 64
+        while True:
+            sampled = self._walk_stream(cdf, count, n)
+            if sampled is not None:
+                return sampled
+            n *= 2
+
+    def _walk_stream(self, cdf, count, n):
+        """Bulk sampling over the next `n` PRNG states, or None if
+        `count` blocks need more states than that
+        """
+
+        states = np.concatenate((np.array([self.state], dtype=np.uint64), gen_lehmer_stream(self.state, n)))
+        degree = np.minimum(np.searchsorted(cdf, states / PRNG_MAX_RAND, side='right'), self.K - 1) + 1
+        index = (states % np.uint64(self.K)).astype(np.int64)
+
+        # run[i] is the length of the longest duplicate-free run of
+        # indices starting at state i: the suffix minimum of the
+        # position where each index next repeats, minus i. Sorting
+        # (index, position) keys groups equal indices in stream order.
+        keys = np.sort(index * (n + 1) + np.arange(n + 1))
+        same, order = np.divmod(keys, n + 1)
+        repeats = same[1:] == same[:-1]
+        next_same = np.full(n + 1, n + 1, dtype=np.int64)
+        next_same[order[:-1][repeats]] = order[1:][repeats]
+        run = np.minimum.accumulate(next_same[::-1])[::-1] - np.arange(n + 1)
+
+        # Block j's seed is states[pos], its degree comes from the next
+        # state and its sources from the draws after that. Draws are
+        # contiguous unless a duplicate was rejected, in which case
+        # exactly as many extra draws as are still missing are taken.
+        degree = degree.tolist()
+        run = run.tolist()
+        pos = 0
+        positions = []
+        degrees = []
+        rejected = {}
+        for j in range(count):
+            if pos + 2 > n:
+                return None
+            d = degree[pos + 1]
+            positions.append(pos)
+            degrees.append(d)
+            pos += 2
+            if run[pos] >= d:
+                pos += d - 1
+                continue
+
+            nums = dict.fromkeys(index[pos:pos + d].tolist())
+            pos += d
+            while len(nums) < d:
+                missing = d - len(nums)
+                if pos + missing > n + 1:
+                    return None
+                nums.update(dict.fromkeys(index[pos:pos + missing].tolist()))
+                pos += missing
+            pos -= 1
+            rejected[j] = list(nums)
+
+        self.state = int(states[pos])
+
+        positions = np.array(positions, dtype=np.int64)
+        degrees = np.array(degrees, dtype=np.int64)
+        offsets = np.zeros(count + 1, dtype=np.int64)
+        np.cumsum(degrees, out=offsets[1:])
+        draws = np.repeat(positions + 2 - offsets[:-1], degrees) + np.arange(offsets[-1])
+        indices = index[np.minimum(draws, n)]
+        for j, nums in rejected.items():
+            indices[offsets[j]:offsets[j + 1]] = nums
+        return states[positions].astype(np.int64), degrees, offsets, indices
@@ -0,0 +1,167 @@
+import asyncio
+import io
+import os
+import random
+import tempfile
+import unittest
+
+from LTcode.lt import decode, encode
+
+def make_file(size, seed=1):
+    rng = random.Random(seed)
+    return bytes(rng.getrandbits(8) for _ in range(size))
+
+def packets(data, blocksize, count, seed=2067261):
+    return encode.encode_batch(io.BytesIO(data), blocksize, seed, count).tobytes()
+
+def decode_blocks(lt_blocks, **kwargs):
+    decoder = decode.LtDecoder(**kwargs)
+    for lt_block in lt_blocks:
+        if decoder.consume_block(lt_block):
+            break
+    if not decoder.is_done() and decoder.inactivation:
+        decoder.solve()
+    return decoder
+
+class TestDecoder(unittest.TestCase):
+    def test_decode(self):
+        for size, blocksize in [(20000, 64), (20001, 61)]:
+            data = make_file(size)
+            K = -(-size // blocksize)
+            buffer = packets(data, blocksize, 2 * K)
+            received = []
+            for backend in decode.BACKENDS:
+                decoder = decode_blocks(decode.read_buffer(buffer), backend=backend)
+                self.assertTrue(decoder.is_done(), f"{backend} decoder failed for blocksize {blocksize}")
+                self.assertEqual(decoder.bytes_dump(), data)
+                received.append(decoder.received)
+
+                out = io.BytesIO()
+                decode.decode(buffer, out, backend=backend)
+                self.assertEqual(out.getvalue(), data)
+            self.assertEqual(received[0], received[1], "Both backends should peel after the same block")
+
+    def test_inactivation_decode(self):
+        a, b, c = 0b0011, 0b0101, 0b1001
+        self.assertEqual(decode.inactivation_decode([({0, 1}, a ^ b), ({1, 2}, b ^ c), ({0, 1, 2}, a ^ b ^ c)]),
+                         {0: a, 1: b, 2: c})
+        self.assertIsNone(decode.inactivation_decode([({0, 1}, a ^ b), ({1, 2}, b ^ c), ({0, 2}, a ^ c)]))
+
+    def test_inactivation(self):
+        # 2% overhead: Belief Propagation alone stalls, inactivation finishes
+        for size, blocksize in [(20000, 40), (20001, 61)]:
+            data = make_file(size)
+            K = -(-size // blocksize)
+            buffer = packets(data, blocksize, int(K * 1.02))
+            self.assertFalse(decode_blocks(decode.read_buffer(buffer)).is_done())
+            for backend in decode.BACKENDS:
+                decoder = decode_blocks(decode.read_buffer(buffer), backend=backend, inactivation=True)
+                self.assertTrue(decoder.is_done(), f"{backend} inactivation failed for blocksize {blocksize}")
+                self.assertEqual(decoder.bytes_dump(), data)
+
+    def test_residual(self):
+        data = make_file(2000)
+        buffer = packets(data, 40, 45)
+        graphs = {}
+        for backend in decode.BACKENDS:
+            decoder = decode_blocks(decode.read_buffer(buffer), backend=backend)
+            self.assertFalse(decoder.is_done())
+            graphs[backend] = decoder.block_graph
+        residuals = [sorted((sorted(nodes), payload) for nodes, payload in graphs[backend].residual())
+                     for backend in decode.BACKENDS]
+        self.assertEqual(residuals[0], residuals[1])
+
+    def test_read_buffer(self):
+        buffer = packets(make_file(1000), 50, 30)
+        size = decode.HEADER_SIZE + 50
+        parsed = [(header, bytes(block)) for header, block in decode.read_buffer(buffer)]
+        expected = [(header, bytes(block))
+                    for header, block in decode.read_blocks(buffer[i:i + size] for i in range(0, len(buffer), size))]
+        self.assertEqual(parsed, expected)
+        self.assertEqual(len(parsed), 30)
+        self.assertIsInstance(next(decode.read_buffer(buffer))[1], memoryview)
+
+    def test_stream(self):
+        data = make_file(20000)
+        K = -(-len(data) // 40)
+        buffer = packets(data, 40, int(K * 1.3))
+        for backend in decode.BACKENDS:
+            decoder = decode.LtDecoder(backend=backend, inactivation=True)
+            chunks = [(offset, bytes(chunk)) for offset, chunk in decoder.stream(decode.read_buffer(buffer))]
+            self.assertTrue(decoder.is_done())
+            offset = 0
+            for chunk_offset, chunk in chunks:
+                self.assertEqual(chunk_offset, offset, "Chunks should extend the prefix in order")
+                offset += len(chunk)
+            self.assertEqual(b''.join(chunk for _, chunk in chunks), data)
+            self.assertEqual(decoder.stats()['prefix'], K)
+
+            async def collect():
+                async def blocks():
+                    for lt_block in decode.read_buffer(buffer):
+                        yield lt_block
+                decoder = decode.LtDecoder(backend=backend, inactivation=True)
+                return [(offset, bytes(chunk)) async for offset, chunk in decoder.astream(blocks())]
+            self.assertEqual(asyncio.run(collect()), chunks)
+
+    def test_on_prefix(self):
+        data = make_file(5000)
+        received = []
+        decoder = decode.LtDecoder(on_prefix=lambda offset, chunk: received.append((offset, bytes(chunk))))
+        for lt_block in decode.read_buffer(packets(data, 50, 400)):
+            if decoder.consume_block(lt_block):
+                break
+        self.assertTrue(decoder.is_done())
+        self.assertEqual(b''.join(chunk for _, chunk in received), data)
+
+        # The callback doesn't consume the prefix stream() yields
+        received = []
+        decoder = decode.LtDecoder(on_prefix=lambda offset, chunk: received.append((offset, bytes(chunk))))
+        streamed = [bytes(chunk) for _, chunk in decoder.stream(decode.read_buffer(packets(data, 50, 400)))]
+        self.assertEqual(b''.join(streamed), data)
+        self.assertEqual(b''.join(chunk for _, chunk in received), data)
+
+class TestCheckpoint(unittest.TestCase):
+    def test_resume(self):
+        # Aligned and unaligned block sizes, with and without a partial last block
+        for size, blocksize in [(20000, 64), (20001, 61)]:
+            data = make_file(size)
+            K = -(-size // blocksize)
+            lt_blocks = list(decode.read_buffer(packets(data, blocksize, 2 * K)))
+            for backend in decode.BACKENDS:
+                reference = decode_blocks(lt_blocks, backend=backend)
+
+                decoder = decode.LtDecoder(backend=backend)
+                for lt_block in lt_blocks[:K // 2]:
+                    decoder.consume_block(lt_block)
+                stats = decoder.stats()
+                with tempfile.TemporaryDirectory() as tmp:
+                    path = os.path.join(tmp, "decoder.state")
+                    decoder.save_state(path)
+                    restored = decode.LtDecoder.load_state(path)
+
+                    self.assertEqual(restored.backend, backend)
+                    for key in ['received', 'recovered', 'prefix']:
+                        self.assertEqual(restored.stats()[key], stats[key], f"{key} after {backend} checkpoint")
+                    for lt_block in lt_blocks[K // 2:]:
+                        if restored.consume_block(lt_block):
+                            break
+                    self.assertTrue(restored.is_done(), f"{backend} decoder did not finish after resuming")
+                    self.assertEqual(restored.received, reference.received, "Resuming should need no extra blocks")
+                    self.assertEqual(restored.bytes_dump(), data)
+
+    def test_uninitialized(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "decoder.state")
+            decode.LtDecoder(backend='numpy', inactivation=True).save_state(path)
+            restored = decode.LtDecoder.load_state(path)
+            self.assertFalse(restored.initialized)
+            self.assertEqual((restored.backend, restored.inactivation), ('numpy', True))
+
+            with open(path, 'wb') as f:
+                f.write(bytes(256))
+            with self.assertRaises(ValueError):
+                decode.LtDecoder.load_state(path)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import io
+import os
+import random
+import tempfile
+import threading
+import unittest
+
+import numpy as np
+
+from LTcode.lt import encode
+from LTcode.lt.encode.parallel import ParallelEncoder
+
+def make_file(size, seed=1):
+    rng = random.Random(seed)
+    return bytes(rng.getrandbits(8) for _ in range(size))
+
+class TestEncoder(unittest.TestCase):
+    def test_backends_identical(self):
+        # Block sizes with and without whole 64-bit words, and a partial last block
+        for size, blocksize in [(5000, 64), (5001, 61), (4096, 1024)]:
+            data = make_file(size)
+            streams = []
+            for backend in encode.BACKENDS:
+                streams.append(b''.join(encode.encoder(io.BytesIO(data), blocksize, seed=7, max_blocks=300,
+                                                       backend=backend)))
+            self.assertEqual(streams[0], streams[1], f"'int' and 'numpy' streams differ for blocksize {blocksize}")
+
+    def test_encode_batch(self):
+        large = encode.NUMPY_MAX_BLOCKSIZE + 8
+        for size, blocksize in [(5000, 64), (5001, 61), (20 * large + 3, large)]:
+            data = make_file(size)
+            expected = b''.join(encode.encoder(io.BytesIO(data), blocksize, seed=7, max_blocks=300))
+            batch = encode.encode_batch(io.BytesIO(data), blocksize, 7, 300)
+            self.assertEqual(batch.tobytes(), expected, f"encode_batch differs from encoder for blocksize {blocksize}")
+            self.assertEqual(batch[5].tobytes(), expected[5 * (12 + blocksize):6 * (12 + blocksize)])
+            self.assertEqual(batch['data'].shape, (300, blocksize))
+
+    def test_file_blocks(self):
+        data = make_file(5001)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "source")
+            with open(path, 'wb') as f:
+                f.write(data)
+            with open(path, 'rb') as f:
+                mapped = encode.FileBlocks(f, 64)
+                in_memory = encode.FileBlocks(io.BytesIO(data), 64)
+                self.assertEqual((len(mapped), mapped.filesize), (79, 5001))
+                for ix in [0, 40, 78]:
+                    self.assertEqual(bytes(mapped.view(ix)), bytes(in_memory.view(ix)))
+                    self.assertEqual(mapped[ix], in_memory[ix])
+                indices = np.array([0, 40, 78])
+                self.assertEqual(mapped.rows(indices).tobytes(), in_memory.rows(indices).tobytes())
+
+                with open(path, 'rb') as f:
+                    expected = b''.join(encode.encoder(f, 64, seed=3, max_blocks=100))
+                self.assertEqual(b''.join(encode.encoder(io.BytesIO(data), 64, seed=3, max_blocks=100)), expected)
+
+    def test_pipe(self):
+        # A pipe can't be memory-mapped or told its position: it is read instead
+        data = make_file(5000)
+        expected = b''.join(encode.encoder(io.BytesIO(data), 100, seed=5, max_blocks=10))
+        r, w = os.pipe()
+        writer = threading.Thread(target=lambda: (os.write(w, data), os.close(w)))
+        writer.start()
+        with open(r, 'rb') as f:
+            self.assertEqual(b''.join(encode.encoder(f, 100, seed=5, max_blocks=10)), expected)
+        writer.join()
+
+    def test_parallel_encoder(self):
+        data = make_file(3000)
+        expected = b''.join(encode.encoder(io.BytesIO(data), 32, seed=11, max_blocks=400))
+        with ParallelEncoder(io.BytesIO(data), 32, seed=11, workers=2) as pe:
+            self.assertEqual(b''.join(pe.encoder(max_blocks=400)), expected)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import io
+import random
+import unittest
+
+from LTcode.lt import objects
+
+def make_file(size, seed=1):
+    rng = random.Random(seed)
+    return bytes(rng.getrandbits(8) for _ in range(size))
+
+class TestObjectPartitioning(unittest.TestCase):
+    def test_partition_object(self):
+        partition_tests = [
+            # transfer length, symbol size, alignment, KMAX, W, (Z, N)
+            (26, 2, 1, objects.MAX_BLOCK_SYMBOLS, objects.MAX_SUB_BLOCK_SIZE, (1, 1)),
+            (1000, 10, 1, 40, 1 << 24, (3, 1)),
+            (1000, 10, 1, 40, 100, (3, 4)),
+            (1000, 12, 4, 40, 100, (3, 3)),
+        ]
+        for length, symbol_size, alignment, kmax, w, expected in partition_tests:
+            result = objects.partition_object(length, symbol_size, alignment, kmax, w)
+            self.assertEqual(result, expected, f"partition_object({length}, {symbol_size}, {alignment}, {kmax}, {w}) = {result}, should be {expected}")
+
+        with self.assertRaises(ValueError):
+            objects.partition_object(1000, 10, alignment=4)
+        with self.assertRaises(ValueError):
+            objects.partition_object(1 << 34, 1 << 20)
+
+    def test_source_blocks(self):
+        self.assertEqual(objects.source_blocks(1000, 10, 3), [(0, 340, 34), (340, 330, 33), (670, 330, 33)])
+        self.assertEqual(objects.source_blocks(995, 10, 3)[-1], (670, 325, 33))
+        self.assertEqual(objects.sub_symbol_sizes(12, 4, 2), [8, 4])
+
+class TestObjectCodec(unittest.TestCase):
+    def test_decode_object(self):
+        data = make_file(30001)
+        packets = objects.encode_object(io.BytesIO(data), 64, 400, seed=99, alignment=8, workers=2,
+                                        max_block_symbols=300, max_sub_block_size=4000)
+        z, n = objects.partition_object(len(data), 64, 8, 300, 4000)
+        self.assertEqual((z, n), (2, 4))
+        self.assertEqual(len(packets), z * 400)
+        self.assertEqual(packets['sbn'][:4].tolist(), [0, 1, 0, 1], "Source blocks should be interleaved")
+
+        for backend in ['int', 'numpy']:
+            out = io.BytesIO()
+            self.assertTrue(objects.decode_object(packets.tobytes(), out, workers=2, backend=backend, inactivation=True))
+            self.assertEqual(out.getvalue(), data)
+
+        # A source block with too few packets cannot be reconstructed
+        out = io.BytesIO()
+        self.assertFalse(objects.decode_object(packets[:40].tobytes(), out, workers=2))
+        self.assertEqual(out.getvalue(), b'')
+
+    def test_map_window(self):
+        # Arguments are only built as worker slots free up
+        produced = []
+        def calls():
+            for i in range(10):
+                produced.append(i)
+                yield (-i,)
+        results = objects._map_window(abs, calls(), 2)
+        self.assertEqual(next(results), 0)
+        self.assertLessEqual(len(produced), 3)
+        self.assertEqual(list(results), list(range(1, 10)))
+
+    def test_object_decoder(self):
+        data = make_file(10000)
+        packets = objects.encode_object(io.BytesIO(data), 50, 200, seed=5, workers=1, max_block_symbols=120)
+        received = list(objects.read_object_buffer(packets.tobytes()))
+        random.Random(2).shuffle(received)
+
+        decoder = objects.ObjectDecoder(inactivation=True)
+        for packet in received:
+            if decoder.consume_packet(packet):
+                break
+        self.assertTrue(decoder.solve())
+        out = io.BytesIO()
+        decoder.stream_dump(out)
+        self.assertEqual(out.getvalue(), data)
+
+if __name__ == "__main__":
+    unittest.main()
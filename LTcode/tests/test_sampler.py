@@ -0,0 +1,42 @@
+import random
+import unittest
+
+from LTcode.lt import sampler
+
+class TestSampler(unittest.TestCase):
+    def test_sample_degree(self):
+        prng = sampler.PRNG((500, sampler.DEFAULT_DELTA, sampler.DEFAULT_C))
+        prng.set_seed(2067261)
+        for _ in range(2000):
+            # Linear scan of the CDF, as the degree used to be sampled
+            p = (sampler.PRNG_A * prng.state % sampler.PRNG_M) / sampler.PRNG_MAX_RAND
+            expected = next((ix + 1 for ix, v in enumerate(prng.cdf) if v > p), len(prng.cdf))
+            self.assertEqual(prng._sample_d(), expected)
+
+    def test_rsd_cdf(self):
+        cdf = sampler.gen_rsd_cdf(100, sampler.DEFAULT_DELTA, sampler.DEFAULT_C)
+        self.assertIs(cdf, sampler.gen_rsd_cdf(100, sampler.DEFAULT_DELTA, sampler.DEFAULT_C))
+        mu = sampler.gen_mu(100, sampler.DEFAULT_DELTA, sampler.DEFAULT_C)
+        self.assertEqual(list(cdf), [sum(mu[:d + 1]) for d in range(100)])
+        self.assertAlmostEqual(cdf[-1], 1.0)
+
+    def test_bulk_matches_scalar(self):
+        rng = random.Random(3)
+        for K in [1, 2, 5, 37, 1172]:
+            for count in [1, 7, 500]:
+                seed = rng.randint(1, sampler.PRNG_M - 1)
+                scalar = sampler.PRNG((K, sampler.DEFAULT_DELTA, sampler.DEFAULT_C))
+                bulk = sampler.PRNG((K, sampler.DEFAULT_DELTA, sampler.DEFAULT_C))
+                scalar.set_seed(seed)
+                bulk.set_seed(seed)
+
+                expected = [scalar.get_src_blocks() for _ in range(count)]
+                blockseeds, degrees, offsets, indices = bulk.get_src_blocks_bulk(count)
+                for j, (blockseed, d, nums) in enumerate(expected):
+                    self.assertEqual((int(blockseeds[j]), int(degrees[j])), (blockseed, d), f"Block {j} of K={K}")
+                    self.assertEqual(set(indices[offsets[j]:offsets[j + 1]].tolist()), nums, f"Block {j} of K={K}")
+                self.assertEqual(bulk.state, scalar.state, f"PRNG state after {count} blocks of K={K}")
+                self.assertEqual(bulk.get_src_blocks(), scalar.get_src_blocks())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,10 @@
 from Raptorcode.utils import *
 from typing import List
-import copy
+import numpy as np
 
 class Block:
+    __slots__ = ('data', 'padding')
+
     def __init__(self, data=None, padding=0):
         self.data = data
         self.padding = padding
@@ -14,43 +16,51 @@ class Block:
     def is_empty(self):
         return self.length() == 0
 
+    def padded_data(self):
+        """
+        The data followed by the padding as zeros, as an immutable copy (or a new list).
+        """
+        if isinstance(self.data, list):
+            return self.data + [0] * self.padding
+        return bytes(self.data or b'').ljust(self.length(), b'\x00')
+
     def xor(self, a):
-        # Handle empty block separately
-        # If not empty, it's guaranteed that types of self.data and a.data will match
-        # return
-        if self.data:
-                if a.data:
-                    if len(self.data) < len(a.data):
-                        inc = len(a.data) - len(self.data)
-                        if isinstance(self.data, bytes):
-                            # self.data += b'\x00'*inc
-                            self.data = self.data.ljust(len(a.data), b'\x00')
-                        else:
-                            self.data.extend([0]*inc)
-                        if self.padding > inc:
-                            self.padding -= inc
-                        else:
-                            self.padding = 0
-                
-                    if isinstance(self.data, bytes):
-                        # res = b''
-                        # for i in range(len(a.data)):
-                        #     res += (self.data[i] ^ a.data[i]).to_bytes(1, byteorder='big')
-                        # for i in range(len(a.data), len(self.data)):
-                        #     res += self.data[i].to_bytes(1, byteorder='big')
-                        # self.data = res
-                        a_pad = a.data.ljust(max(len(self.data), len(a.data)), b'\x00')
-                        res = bytes([a ^ b for a, b in zip(self.data, a_pad)])
-                        self.data = res
-                    else:
-                        for i in range(len(a.data)):
-                            self.data[i] = (self.data[i] ^ a.data[i])
+        # Handle empty block separately: take a private copy of a's data
+        # If not empty, it's guaranteed that a.data is a list when self.data is, and bytes-like otherwise
+        if not self.data:
+            self.data = list(a.data) if isinstance(a.data, list) else bytearray(a.data) if a.data is not None else None
+            return
+        if not a.data:
+            return
+
+        if len(self.data) < len(a.data):
+            inc = len(a.data) - len(self.data)
+            if isinstance(self.data, list):
+                self.data.extend([0]*inc)
+            else:
+                self.data = _writable(self.data)
+                self.data.extend(bytes(inc))
+            if self.padding > inc:
+                self.padding -= inc
+            else:
+                self.padding = 0
+
+        if isinstance(self.data, list):
+            for i in range(len(a.data)):
+                self.data[i] = (self.data[i] ^ a.data[i])
         else:
-            self.data = copy.deepcopy(a.data)
+            # Immutable data is copied on the first XOR, then XORed in place
+            self.data = _writable(self.data)
+            n = len(a.data)
+            dst = np.frombuffer(self.data, dtype=np.uint8, count=n)
+            np.bitwise_xor(dst, np.frombuffer(a.data, dtype=np.uint8, count=n), out=dst)
 
     def __str__(self):
         return str(self.data)
 
+def _writable(data):
+    return data if isinstance(data, bytearray) else bytearray(data)
+
 def partition_bytes(data, p):
     def slice_into_blocks(data, num, length):
         blocks = []
@@ -124,15 +134,38 @@ class SparseMatrix:
     def determined(self):
         return all(len(r) > 0 for r in self.coeff)
 
+    def pack_row(self, indices):
+        """
+        A sorted list of column indices in this matrix's row representation.
+        """
+        return indices
+
+    def row_indices(self, s):
+        """
+        The sorted column indices of row `s`.
+        """
+        return self.coeff[s]
+
     def reduce(self):
+        """
+        Back-substitution on the triangular matrix: walking pivots from last to first, the
+        value of pivot i is final and is XORed into every row that has column i as a
+        non-pivot coefficient, found through a column -> rows index. Each row is thus XORed
+        exactly once per coefficient, O(nonzeros) block XORs overall. Raises ValueError if
+        the matrix is not determined, since some values would then be left unsolved.
+        """
+        if not self.determined():
+            raise ValueError("Cannot reduce a matrix that is not determined")
+
+        rows_with = [[] for _ in self.coeff]
+        for j in range(len(self.coeff)):
+            for column in self.row_indices(j)[1:]:
+                rows_with[column].append(j)
+
         for i in range(len(self.coeff) - 1, -1, -1):
-            for j in range(i):
-                ci, cj = self.coeff[i], self.coeff[j]
-                for k in range(1, len(cj)):
-                    if cj[k] == ci[0]:
-                        self.v[j].xor(self.v[i])
-                        continue
-            self.coeff[i] = self.coeff[i][:1]
+            for j in rows_with[i]:
+                self.v[j].xor(self.v[i])
+            self.coeff[i] = [i]
 
     def reconstruct(self, total_length, len_long, len_short, num_long, num_short):
         out = bytearray()
@@ -145,5 +178,76 @@ class SparseMatrix:
     def __str__(self):
         s = "-------matrix-------\n"
         for i in range(len(self.coeff)):
-            s += (f"{self.coeff[i]} = {self.v[i].data}\n")
-        return s
\ No newline at end of file
+            s += (f"{self.row_indices(i)} = {self.v[i].data}\n")
+        return s
+
+# Rows of a BitMatrix with more coefficients than this are stored as bitsets
+DENSE_ROW_THRESHOLD = 32
+
+def _row_weight(row):
+    return row.bit_count() if isinstance(row, int) else len(row)
+
+def _row_pivot(row):
+    return (row & -row).bit_length() - 1 if isinstance(row, int) else row[0]
+
+def _row_bits(row):
+    if isinstance(row, int):
+        return row
+    bits = 0
+    for index in row:
+        bits |= 1 << index
+    return bits
+
+def _bit_indices(bits):
+    indices = []
+    while bits:
+        low = bits & -bits
+        indices.append(low.bit_length() - 1)
+        bits ^= low
+    return indices
+
+class BitMatrix(SparseMatrix):
+    """
+    SparseMatrix over GF(2) whose rows switch representation with their weight: sparse rows
+    are sorted index lists as in SparseMatrix, and rows with more than DENSE_ROW_THRESHOLD
+    coefficients become int bitsets (bit j for column j), so XORing two long rows is a single
+    word-parallel operation rather than a list merge. Rows switch back once they thin out.
+    """
+
+    def pack_row(self, row):
+        if isinstance(row, int):
+            return row if row.bit_count() > DENSE_ROW_THRESHOLD else _bit_indices(row)
+        return _row_bits(row) if len(row) > DENSE_ROW_THRESHOLD else row
+
+    def row_indices(self, s):
+        row = self.coeff[s]
+        return _bit_indices(row) if isinstance(row, int) else row
+
+    def xor_row(self, s, indices, block):
+        coeffs = self.coeff[s]
+        if isinstance(coeffs, int) or isinstance(indices, int):
+            block.xor(self.v[s])
+            return self.pack_row(_row_bits(coeffs) ^ _row_bits(indices)), block
+        indices, block = super().xor_row(s, indices, block)
+        return self.pack_row(indices), block
+
+    def add_equation(self, components, block):
+        components = self.pack_row(components)
+        while components:
+            s = _row_pivot(components)
+            if not self.coeff[s]:
+                break
+            if _row_weight(components) >= _row_weight(self.coeff[s]):
+                components, block = self.xor_row(s, components, block)
+            else:
+                components, self.coeff[s] = self.coeff[s], components
+                block, self.v[s] = self.v[s], block
+
+        if components:
+            self.coeff[_row_pivot(components)] = components
+            self.v[_row_pivot(components)] = block
+
+    def determined(self):
+        return all(self.coeff)
+
+MATRIX_TYPES = {'sparse': SparseMatrix, 'bits': BitMatrix}
\ No newline at end of file
@@ -1,5 +1,6 @@
 import unittest
 import random
+from unittest.mock import patch
 from block import *
 
 class TestRaptorCodec(unittest.TestCase):
@@ -29,6 +30,25 @@ class TestRaptorCodec(unittest.TestCase):
             self.assertGreaterEqual(a.length(), original_length)
             self.assertEqual(a.data, expected_out.data)
 
+    def test_block_xor_copies(self):
+        source = b'\x01\x02\x03'
+        a = Block()
+        a.xor(Block(source))
+        a.xor(Block(b'\x01\x01\x01'))
+        self.assertEqual(a.data, b'\x00\x03\x02')
+
+        # XOR never writes into the other block's data, nor shares it
+        b = Block(b'\x0f')
+        b.xor(a)
+        a.xor(Block(b'\xff'))
+        self.assertEqual(b.data, b'\x0f\x03\x02')
+        self.assertEqual(a.data, b'\xff\x03\x02')
+        self.assertEqual(source, b'\x01\x02\x03')
+
+        lists = Block([1, 2])
+        lists.xor(Block([3, 3, 3]))
+        self.assertEqual(lists.data, [2, 1, 3])
+
     def test_partition_bytes(self):
         a = bytes(range(100))
         partition_tests = [
@@ -126,6 +146,13 @@ class TestRaptorCodec(unittest.TestCase):
         self.assertEqual(m.coeff[1], [1])
         self.assertEqual(m.v[1].data, b'\x03')
 
+    def test_matrix_reduce_undetermined(self):
+        m = SparseMatrix()
+        m.coeff = [[0, 1], []]
+        m.v = [Block(b'\x01'), Block()]
+        with self.assertRaises(ValueError):
+            m.reduce()
+
     def test_matrix_large(self):
         m = SparseMatrix()
         m.coeff = [[] for _ in range(4)]
@@ -163,5 +190,40 @@ class TestRaptorCodec(unittest.TestCase):
         self.assertEqual(m.coeff[0], [0, 2], f"Got {m.coeff[0]} for coeff[0], expect [0, 2]")
         self.assertEqual(m.coeff[1], [1, 3], f"Got {m.coeff[1]} for coeff[1], expect [1, 3]")
 
+    def test_matrix_reduce(self):
+        m = SparseMatrix()
+        m.coeff = [[0, 1, 2, 3], [1, 3], [2, 3], [3]]
+        m.v = [Block(b'\x01'), Block(b'\x02'), Block(b'\x04'), Block(b'\x08')]
+        m.reduce()
+
+        # x3 = 8, x2 = 4 ^ x3, x1 = 2 ^ x3, x0 = 1 ^ x1 ^ x2 ^ x3
+        self.assertEqual(m.coeff, [[0], [1], [2], [3]])
+        self.assertEqual([b.data for b in m.v], [b'\x0f', b'\x0a', b'\x0c', b'\x08'])
+
+    def test_bit_matrix(self):
+        random.seed(7)
+        n = 40
+        equations = []
+        for _ in range(3 * n):
+            indices = sorted(random.sample(range(n), random.randint(1, 12)))
+            equations.append((indices, bytes(random.randint(0, 255) for _ in range(4))))
+
+        sparse, bits = SparseMatrix(), BitMatrix()
+        for m in (sparse, bits):
+            m.coeff = [[] for _ in range(n)]
+            m.v = [Block() for _ in range(n)]
+        with patch("block.DENSE_ROW_THRESHOLD", 3):
+            for indices, data in equations:
+                sparse.add_equation(list(indices), Block(data))
+                bits.add_equation(list(indices), Block(data))
+            self.assertTrue(any(isinstance(row, int) for row in bits.coeff), "Some rows should be stored as bitsets")
+            self.assertEqual([bits.row_indices(i) for i in range(n)], sparse.coeff)
+            self.assertEqual(bits.determined(), sparse.determined())
+            self.assertTrue(bits.determined())
+            bits.reduce()
+        sparse.reduce()
+        self.assertEqual(bits.coeff, sparse.coeff)
+        self.assertEqual([b.data for b in bits.v], [b.data for b in sparse.v])
+
 if __name__ == "__main__":
     unittest.main()
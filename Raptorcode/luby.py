@@ -3,6 +3,9 @@ from Raptorcode.block import *
 from Raptorcode.utils import *
 
 class Codec:
+    # Whether encoding symbols 0 to K - 1 are the source symbols themselves
+    systematic = False
+
     def generate_intermediate_blocks(self, message, num_blocks):
         raise NotImplementedError()
 
@@ -66,13 +69,24 @@ class LubyDecoder:
 
 
 def encode_lt_blocks(message, encoded_block_ids, codec):
-    source = codec.generate_intermediate_blocks(message, codec.source_blocks)
+    # A systematic codec emits source symbols as they are, and only needs the
+    # intermediate blocks once a repair symbol is asked for
+    symbols = codec.generate_source_blocks(message, codec.source_blocks) if codec.systematic else None
+    source = None
 
     lt_blocks = []
     for block_id in encoded_block_ids:
+        if symbols is not None and block_id < codec.source_blocks:
+            lt_blocks.append(LTBlock(block_code=block_id, data=symbols[block_id].padded_data()))
+            continue
+
+        if source is None:
+            source = codec.generate_intermediate_blocks(message, codec.source_blocks)
         indices = codec.pick_indices(block_id)
         block = generate_luby_transform_block(source, indices)
-        lt_block = LTBlock(block_code=block_id, data=block.data)
+        # Hand out immutable data: decoders XOR received blocks in place
+        data = bytes(block.data) if isinstance(block.data, bytearray) else block.data
+        lt_block = LTBlock(block_code=block_id, data=data)
         lt_blocks.append(lt_block)
     
     return lt_blocks
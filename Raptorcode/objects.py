@@ -0,0 +1,165 @@
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from Raptorcode.luby import LTBlock, encode_lt_blocks
+from Raptorcode import constants
+from Raptorcode.raptor import *
+from Raptorcode.utils import *
+
+# Largest source block, in symbols (KMAX): systematic indices are defined up to K = 8192
+MAX_BLOCK_SYMBOLS = constants.MAX_SOURCE_SYMBOLS
+
+# Smallest source block, in symbols: RFC 5053 defines the code for K >= 4 only
+MIN_BLOCK_SYMBOLS = 4
+
+# Largest sub-block the decoder works on at once, in bytes (W)
+MAX_SUB_BLOCK_SIZE = 1 << 24
+
+class ObjectBlock:
+    def __init__(self, sbn, block_code, data):
+        """
+        An encoding symbol of source block `sbn`.
+        """
+        self.sbn = sbn
+        self.block_code = block_code
+        self.data = data
+
+def partition_object(transfer_length, symbol_size, alignment=1,
+                     max_block_symbols=MAX_BLOCK_SYMBOLS, max_sub_block_size=MAX_SUB_BLOCK_SIZE):
+    """
+    Number of source blocks Z and sub-blocks N for an object of `transfer_length` bytes
+    cut into `symbol_size` byte symbols (RFC 5053, section 5.3.1.2).
+    """
+    if symbol_size % alignment:
+        raise ValueError(f"Symbol size {symbol_size} is not a multiple of the alignment {alignment}")
+    kt = max(1, math.ceil(transfer_length / symbol_size))
+    z = math.ceil(kt / max_block_symbols)
+    n = min(math.ceil(math.ceil(kt / z) * symbol_size / max_sub_block_size), symbol_size // alignment)
+    return z, n
+
+def source_blocks(transfer_length, symbol_size, z):
+    """
+    The (offset, length, K) of each of the `z` source blocks; the first ones hold one
+    symbol more than the rest. Blocks of fewer than MIN_BLOCK_SYMBOLS symbols are padded
+    up to it with zero symbols.
+    """
+    kt = max(1, math.ceil(transfer_length / symbol_size))
+    kl, ks, zl, zs = partition(kt, z)
+    blocks = []
+    offset = 0
+    for k in [kl] * zl + [ks] * zs:
+        length = min(k * symbol_size, transfer_length - offset)
+        blocks.append((offset, length, max(k, MIN_BLOCK_SYMBOLS)))
+        offset += length
+    return blocks
+
+def sub_symbol_sizes(symbol_size, alignment, n):
+    """
+    Size in bytes of the sub-symbol each of the `n` sub-blocks takes from every symbol.
+    """
+    tl, ts, nl, ns = partition(symbol_size // alignment, n)
+    return [tl * alignment] * nl + [ts * alignment] * ns
+
+def split_sub_blocks(data, k, symbol_size, sizes):
+    """
+    Pad a source block to `k` symbols and split it into sub-blocks: sub-block j holds the
+    j-th sub-symbol of every symbol.
+    """
+    data = bytes(data).ljust(k * symbol_size, b'\x00')
+    sub_blocks = []
+    start = 0
+    for size in sizes:
+        sub_blocks.append(b''.join(data[i + start:i + start + size] for i in range(0, len(data), symbol_size)))
+        start += size
+    return sub_blocks
+
+def join_sub_blocks(sub_blocks, k, sizes):
+    """
+    Inverse of `split_sub_blocks`, padding included.
+    """
+    out = bytearray()
+    for i in range(k):
+        for sub_block, size in zip(sub_blocks, sizes):
+            out.extend(sub_block[i * size:(i + 1) * size])
+    return bytes(out)
+
+def _encode_source_block(sbn, data, k, symbol_size, sizes, ids, alignment):
+    """
+    Worker: the encoding symbols `ids` of one source block.
+    """
+    codec = RaptorCodec(k, alignment)
+    encoded = [encode_lt_blocks(sub_block, ids, codec) for sub_block in split_sub_blocks(data, k, symbol_size, sizes)]
+    return [ObjectBlock(sbn, block_code, b''.join(bytes(blocks[i].data) for blocks in encoded))
+            for i, block_code in enumerate(ids)]
+
+def encode_object(message, symbol_size, ids, alignment=1, workers=None,
+                  max_block_symbols=MAX_BLOCK_SYMBOLS, max_sub_block_size=MAX_SUB_BLOCK_SIZE):
+    """
+    Encode `message` as independently decodable source blocks, generating the encoding
+    symbols `ids` of every source block, one process per source block at a time. The
+    symbols of different source blocks are interleaved.
+    """
+    z, n = partition_object(len(message), symbol_size, alignment, max_block_symbols, max_sub_block_size)
+    sizes = sub_symbol_sizes(symbol_size, alignment, n)
+    with ProcessPoolExecutor(workers or os.cpu_count() or 1) as pool:
+        futures = [pool.submit(_encode_source_block, sbn, message[offset:offset + length], k, symbol_size, sizes,
+                               ids, alignment)
+                   for sbn, (offset, length, k) in enumerate(source_blocks(len(message), symbol_size, z))]
+        encoded = [future.result() for future in futures]
+    return [blocks[i] for i in range(len(ids)) for blocks in encoded]
+
+def _decode_source_block(decoders, k, sizes):
+    """
+    Worker: the padded source block recovered by its sub-block decoders.
+    """
+    return join_sub_blocks([decoder.decode() for decoder in decoders], k, sizes)
+
+class ObjectDecoder:
+    def __init__(self, transfer_length, symbol_size, alignment=1, matrix_type='sparse',
+                 max_block_symbols=MAX_BLOCK_SYMBOLS, max_sub_block_size=MAX_SUB_BLOCK_SIZE):
+        """
+        Decoder for an object encoded by `encode_object` with the same parameters: a
+        RaptorDecoder per sub-block of every source block.
+        """
+        self.transfer_length = transfer_length
+        z, n = partition_object(transfer_length, symbol_size, alignment, max_block_symbols, max_sub_block_size)
+        self.sizes = sub_symbol_sizes(symbol_size, alignment, n)
+        self.blocks = source_blocks(transfer_length, symbol_size, z)
+        self.decoders = [[RaptorDecoder(RaptorCodec(k, alignment), k * size, matrix_type) for size in self.sizes]
+                         for _, _, k in self.blocks]
+        self.determined = [False] * z
+
+    def add_blocks(self, blocks):
+        """
+        Route encoding symbols to their source block's sub-block decoders, each of which
+        gets all of its symbols in one call. Returns True once every source block is
+        determined.
+        """
+        by_sbn = {}
+        for block in blocks:
+            if not self.determined[block.sbn]:
+                by_sbn.setdefault(block.sbn, []).append(block)
+        for sbn, sbn_blocks in by_sbn.items():
+            start = 0
+            determined = True
+            for decoder, size in zip(self.decoders[sbn], self.sizes):
+                determined &= decoder.add_blocks([LTBlock(block.block_code, block.data[start:start + size])
+                                                  for block in sbn_blocks])
+                start += size
+            self.determined[sbn] = determined
+        return all(self.determined)
+
+    def decode(self, workers=None):
+        """
+        Recover the object, one process per source block at a time, or return None if
+        some source block is not determined yet.
+        """
+        if not all(self.determined):
+            return None
+        with ProcessPoolExecutor(workers or os.cpu_count() or 1) as pool:
+            futures = [pool.submit(_decode_source_block, decoders, k, self.sizes)
+                       for decoders, (_, _, k) in zip(self.decoders, self.blocks)]
+            out = bytearray()
+            for future, (_, length, _) in zip(futures, self.blocks):
+                out.extend(future.result()[:length])
+        return bytes(out)
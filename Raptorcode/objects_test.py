@@ -0,0 +1,55 @@
+import random
+import unittest
+from objects import *
+
+class TestObjectPartitioning(unittest.TestCase):
+    def test_partition_object(self):
+        partition_tests = [
+            # transfer length, symbol size, alignment, KMAX, W, (Z, N)
+            (26, 2, 1, 8192, 1 << 24, (1, 1)),
+            (1000, 10, 1, 40, 1 << 24, (3, 1)),
+            (1000, 10, 1, 40, 100, (3, 4)),
+            (1000, 12, 4, 40, 100, (3, 3)),
+        ]
+        for length, symbol_size, alignment, kmax, w, expected in partition_tests:
+            result = partition_object(length, symbol_size, alignment, kmax, w)
+            self.assertEqual(result, expected, f"partition_object({length}, {symbol_size}, {alignment}, {kmax}, {w}) = {result}, should be {expected}")
+
+    def test_source_blocks(self):
+        blocks = source_blocks(1000, 10, 3)
+        self.assertEqual(blocks, [(0, 340, 34), (340, 330, 33), (670, 330, 33)])
+        blocks = source_blocks(995, 10, 3)
+        self.assertEqual(blocks[-1], (670, 325, 33))
+        self.assertEqual(sub_symbol_sizes(12, 4, 2), [8, 4])
+
+    def test_sub_blocks(self):
+        data = bytes(range(50))
+        sizes = sub_symbol_sizes(8, 2, 3)
+        sub_blocks = split_sub_blocks(data, 7, 8, sizes)
+        self.assertEqual([len(b) for b in sub_blocks], [7 * size for size in sizes])
+        self.assertEqual(join_sub_blocks(sub_blocks, 7, sizes)[:len(data)], data)
+
+    def test_object_codec(self):
+        random.seed(4)
+        message = bytes(random.randint(0, 255) for _ in range(301))
+        blocks = encode_object(message, 4, list(range(40)), alignment=2, workers=2,
+                               max_block_symbols=30, max_sub_block_size=64)
+        self.assertEqual(len(blocks), 3 * 40)
+
+        decoder = ObjectDecoder(len(message), 4, alignment=2, max_block_symbols=30, max_sub_block_size=64)
+        self.assertEqual(len(decoder.decoders), 3)
+        self.assertEqual(len(decoder.decoders[0]), 2)
+        random.shuffle(blocks)
+        self.assertTrue(decoder.add_blocks(blocks))
+        self.assertEqual(decoder.decode(workers=2), message)
+
+    def test_small_objects(self):
+        self.assertEqual(source_blocks(10, 4, 1), [(0, 10, 4)])
+        for message, symbol_size, alignment in [(bytes(10), 4, 1), (b'abc', 1, 1), (b'abcdefg', 4, 2), (b'', 4, 1)]:
+            blocks = encode_object(message, symbol_size, list(range(40)), alignment=alignment, workers=1)
+            decoder = ObjectDecoder(len(message), symbol_size, alignment=alignment)
+            self.assertTrue(decoder.add_blocks(blocks[10:]))
+            self.assertEqual(decoder.decode(workers=1), message)
+
+if __name__ == "__main__":
+    unittest.main()
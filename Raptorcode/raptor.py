@@ -1,17 +1,81 @@
 import math
-from functools import reduce
+import os
+import sys
+from array import array
+from functools import lru_cache, reduce
+from struct import calcsize, pack, unpack_from
+import numpy as np
 from Raptorcode.block import *
-from Raptorcode.constants import *
+from Raptorcode.luby import LTBlock, generate_luby_transform_block
+from Raptorcode import constants
 from Raptorcode.utils import *
 
+# Number of K values whose pre-code rows are kept by `precode_rows`
+PRECODE_CACHE_SIZE = 16
+
+# Repair symbols whose indices RaptorEncoder.symbols generates at once
+ENCODER_BATCH_SIZE = 256
+
+# Received symbols whose indices RaptorDecoder.add_blocks generates at once
+DECODER_BATCH_SIZE = 1024
+
+# Decoder checkpoint format, see `RaptorDecoder.save_state`
+STATE_MAGIC = b'RPDS'
+STATE_VERSION = 2
+_STATE_HEADER = '<4sIQQQQQQQQQ'
+
+# Modulus of the triple generator
+TRIPLE_MODULUS = 65521
+
+# Degree distribution: deg(v) = DEGREES[j] for DEGREE_THRESHOLDS[j - 1] <= v < DEGREE_THRESHOLDS[j]
+DEGREE_THRESHOLDS = [0, 10241, 491582, 712794, 831695, 948446, 1032189, 1048576]
+DEGREES = [0, 1, 2, 3, 4, 10, 11, 40]
+
+# The tables behind raptor_rand, raptor_rand_array and deg_array; raptor_rand indexes
+# plain lists, which is faster than indexing the array('I') tables
+v0table = constants.v0table.tolist()
+v1table = constants.v1table.tolist()
+V0 = np.array(v0table, dtype=np.uint32)
+V1 = np.array(v1table, dtype=np.uint32)
+_DEGREE_BOUNDS = np.array(DEGREE_THRESHOLDS[1:-1], dtype=np.uint32)
+_DEGREES = np.array(DEGREES, dtype=np.int64)
+
+# Kinds of Block data in a checkpoint
+_DATA_NONE, _DATA_BYTES, _DATA_LIST = 0, 1, 2
+
+def _pack_data(items):
+    """
+    Offsets, kinds and concatenated bytes of the Block data `items` for a checkpoint.
+    """
+    offsets = array('q', [0])
+    kinds = array('B')
+    data = bytearray()
+    for item in items:
+        if item is None:
+            kinds.append(_DATA_NONE)
+        else:
+            kinds.append(_DATA_LIST if isinstance(item, list) else _DATA_BYTES)
+            data.extend(item)
+        offsets.append(len(data))
+    return offsets, kinds, data
+
+def _unpack_data(data, offsets, kinds, i):
+    """
+    The i-th Block data packed by `_pack_data`.
+    """
+    if kinds[i] == _DATA_NONE:
+        return None
+    item = data[offsets[i]:offsets[i + 1]]
+    return list(item) if kinds[i] == _DATA_LIST else item
+
 def raptor_rand(x, i, m):
     v0 = v0table[(x + i) % 256]
     v1 = v1table[((x // 256) + i) % 256]
     return (v0 ^ v1) % m
 
 def deg(v):
-    f = [0, 10241, 491582, 712794, 831695, 948446, 1032189, 1048576]
-    d = [0, 1, 2, 3, 4, 10, 11, 40]
+    f = DEGREE_THRESHOLDS
+    d = DEGREES
 
     for j in range(1, len(f) - 1):
         if v < f[j]:
@@ -19,7 +83,54 @@ def deg(v):
 
     return d[-1]
 
+def raptor_rand_array(x, i, m):
+    """
+    raptor_rand over NumPy arrays: `x`, `i` and `m` may be arrays or scalars and are
+    broadcast against each other. Returns a uint32 array.
+    """
+    x = np.asarray(x, dtype=np.uint64)
+    return (V0[(x + i) % 256] ^ V1[(x // 256 + i) % 256]) % np.asarray(m, dtype=np.uint32)
+
+def deg_array(v):
+    """
+    deg over a NumPy array of values, by binary search in DEGREE_THRESHOLDS.
+    """
+    return _DEGREES[np.searchsorted(_DEGREE_BOUNDS, v, side='right') + 1]
+
+def _intermediate_symbol_table(kmax):
+    """
+    intermediate_symbols for K = 0, ..., kmax at once with NumPy, as a list of (L, S, H)
+    tuples; the same steps, each applied to all K together.
+    """
+    k = np.arange(kmax + 1, dtype=np.int64)
+    x = np.maximum(np.floor(np.sqrt(2 * k)).astype(np.int64), 1)
+    short = np.flatnonzero(x * (x - 1) < 2 * k)
+    while len(short):
+        x[short] += 1
+        short = short[x[short] * (x[short] - 1) < 2 * k[short]]
+
+    s = np.ceil(0.01 * k).astype(np.int64) + x
+    s = np.frombuffer(prime_table(), dtype=np.uint32)[s].astype(np.int64)
+
+    h = np.floor(np.log(s + k) / np.log(4)).astype(np.int64)
+    binomials = np.array([center_binomial(i) for i in range(int(h.max()) + 64)], dtype=object)
+    short = np.flatnonzero(binomials[h] < k + s)
+    while len(short):
+        h[short] += 1
+        short = short[binomials[h[short]] < (k + s)[short]]
+
+    return list(zip((k + s + h).tolist(), s.tolist(), h.tolist()))
+
+# (L, S, H) for every K that has a systematic index
+INTERMEDIATE_SYMBOL_TABLE = _intermediate_symbol_table(constants.MAX_SOURCE_SYMBOLS)
+
 def intermediate_symbols(k):
+    if 0 <= k < len(INTERMEDIATE_SYMBOL_TABLE):
+        return INTERMEDIATE_SYMBOL_TABLE[k]
+    return _intermediate_symbols(k)
+
+@lru_cache(maxsize=None)
+def _intermediate_symbols(k):
     x = int(math.floor(math.sqrt(2 * k)))
     if x < 1:
         x = 1
@@ -36,26 +147,52 @@ def intermediate_symbols(k):
 
     return k + s + h, s, h
 
-def triple_generator(k, x):
-    l, _, _ = intermediate_symbols(k)
-    lprime = smallest_prime_greater_or_equal(l)
-    q = 65521
-    jk = systematicIndexTable[k]
+class RaptorParams:
+    __slots__ = ('k', 'l', 's', 'h', 'lprime', 'j', 'a', 'b')
 
-    a = (53591 + (jk * 997)) % q
-    b = (10267 * (jk + 1)) % q
-    y = (b + (x * a)) % q
+    def __init__(self, k):
+        """
+        Everything the index generation derives from K alone: the number of intermediate
+        symbols L = K + S + H, the smallest prime L' >= L, the systematic index J(K) and the
+        triple generator's A and B. Get them through `raptor_params`, which builds them once.
+        """
+        self.k = k
+        self.l, self.s, self.h = intermediate_symbols(k)
+        self.lprime = smallest_prime_greater_or_equal(self.l)
+        self.j = constants.systematicIndexTable[k]
+        self.a = (53591 + (self.j * 997)) % TRIPLE_MODULUS
+        self.b = (10267 * (self.j + 1)) % TRIPLE_MODULUS
+
+@lru_cache(maxsize=None)
+def raptor_params(k):
+    return RaptorParams(k)
+
+def triple_generator(k, x, params=None):
+    params = params or raptor_params(k)
+    y = (params.b + (x * params.a)) % TRIPLE_MODULUS
     v = raptor_rand(y, 0, 1048576)
     d = deg(v)
-    a = 1 + raptor_rand(y, 1, lprime - 1)
-    b = raptor_rand(y, 2, lprime)
+    a = 1 + raptor_rand(y, 1, params.lprime - 1)
+    b = raptor_rand(y, 2, params.lprime)
+
+    return d, a, b
+
+def triple_generator_array(k, xs, params=None):
+    """
+    triple_generator for an array of encoding symbol ids: returns the arrays d, a and b.
+    """
+    params = params or raptor_params(k)
+    y = (params.b + np.asarray(xs, dtype=np.uint64) * params.a) % TRIPLE_MODULUS
+    d = deg_array(raptor_rand_array(y, 0, 1048576))
+    a = 1 + raptor_rand_array(y, 1, params.lprime - 1)
+    b = raptor_rand_array(y, 2, params.lprime)
 
     return d, a, b
 
-def find_lt_indices(k, x):
-    l, _, _ = intermediate_symbols(k)
-    lprime = smallest_prime_greater_or_equal(l)
-    d, a, b = triple_generator(k, x)
+def find_lt_indices(k, x, params=None):
+    params = params or raptor_params(k)
+    l, lprime = params.l, params.lprime
+    d, a, b = triple_generator(k, x, params)
 
     if d > l:
         d = l
@@ -73,8 +210,45 @@ def find_lt_indices(k, x):
 
     return sorted(indices)
 
-def lt_encode(k, x, c):
-    indices = find_lt_indices(k, x)
+def find_lt_indices_batch(k, xs, params=None):
+    """
+    find_lt_indices for every encoding symbol id in `xs` at once: the triples are computed
+    with NumPy over the whole batch, then all index walks advance in lockstep, one step
+    for every symbol per iteration. Returns a list of sorted index lists.
+    """
+    params = params or raptor_params(k)
+    l, lprime = params.l, params.lprime
+    xs = np.asarray(xs, dtype=np.uint64).reshape(-1)
+    if not len(xs):
+        return []
+    d, a, b = triple_generator_array(k, xs, params)
+    d = np.minimum(d, l)
+
+    # Skip to the first index below L
+    skip = np.flatnonzero(b >= l)
+    while len(skip):
+        b[skip] = (b[skip] + a[skip]) % lprime
+        skip = skip[b[skip] >= l]
+
+    indices = np.full((len(xs), int(d.max())), l, dtype=np.int64)
+    indices[:, 0] = b
+    count = np.ones(len(xs), dtype=np.int64)
+    walking = np.flatnonzero(count < d)
+    while len(walking):
+        b[walking] = (b[walking] + a[walking]) % lprime
+        found = walking[b[walking] < l]
+        indices[found, count[found]] = b[found]
+        count[found] += 1
+        walking = walking[count[walking] < d[walking]]
+
+    # Padding (L) sorts last, so dropping it leaves each row's indices in order
+    indices.sort(axis=1)
+    flat = indices[indices < l].tolist()
+    ends = np.cumsum(d).tolist()
+    return [flat[end - n:end] for end, n in zip(ends, d.tolist())]
+
+def lt_encode(k, x, c, params=None):
+    indices = find_lt_indices(k, x, params)
 
     result = Block()
     for i in indices:
@@ -88,8 +262,7 @@ def raptor_intermediate_blocks(source):
     a systematic LT code.
     """
     lt_decoder = RaptorDecoder(RaptorCodec(alignment_size=1, source_blocks=len(source)), 1)
-    for i in range(len(source)):
-        indices = find_lt_indices(len(source), i)
+    for i, indices in enumerate(find_lt_indices_batch(len(source), range(len(source)))):
         lt_decoder.matrix.add_equation(indices, source[i])
 
     lt_decoder.matrix.reduce()
@@ -97,7 +270,55 @@ def raptor_intermediate_blocks(source):
     intermediate = lt_decoder.matrix.v
     return intermediate
 
+@lru_cache(maxsize=PRECODE_CACHE_SIZE)
+def precode_rows(k):
+    """
+    The pre-code constraints for `k` source blocks, the LDPC and Half symbol equations, as
+    the rows of an empty decoding matrix after elimination: one sorted index tuple per row,
+    empty rows included. Computed once per K and shared by every decoder, and so by every
+    encoder through `raptor_intermediate_blocks`.
+    """
+    l, s, h = intermediate_symbols(k)
+    matrix = SparseMatrix()
+    matrix.coeff = [[] for _ in range(l)]
+    matrix.v = [Block() for _ in range(l)]
+
+    compositions = [[] for _ in range(s)]
+    for i in range(k):
+        a = 1 + (int(math.floor(i / s)) % (s - 1))
+        b = i % s
+        compositions[b].append(i)
+        b = (b + a) % s
+        compositions[b].append(i)
+        b = (b + a) % s
+        compositions[b].append(i)
+    for i in range(s):
+        compositions[i].append(k + i)
+        matrix.add_equation(compositions[i], Block())
+
+    compositions = [[] for _ in range(h)]
+
+    hprime = int(math.ceil(h / 2))
+    m = build_gray_sequence(k + s, hprime)
+    for j in range(k + s):
+        # Walk only the bits set in m[j] rather than testing all h of them
+        g = m[j]
+        while g:
+            low = g & -g
+            i = low.bit_length() - 1
+            if i < h:
+                compositions[i].append(j)
+            g ^= low
+    for i in range(h):
+        compositions[i].append(k + s + i)
+        matrix.add_equation(compositions[i], Block())
+
+    return tuple(tuple(row) for row in matrix.coeff)
+
 class RaptorCodec:
+    # The first K encoding symbols are the source symbols themselves
+    systematic = True
+
     def __init__(self, source_blocks, alignment_size):
         """
         Initialize a new RaptorCodec object with the specified number of source blocks and symbol alignment size.
@@ -106,25 +327,83 @@ class RaptorCodec:
         # Symbol size must be within [4, 8192]
         self.symbol_size = alignment_size
 
+    def generate_source_blocks(self, message, num_blocks):
+        """
+        Split a message into its source symbols: encoding symbols 0 to K - 1.
+        """
+        source_long, source_short = partition_bytes(message, num_blocks)
+        return equalize_block_lengths(source_long, source_short)
+
     def generate_intermediate_blocks(self, message, num_blocks):
         """
         Generate intermediate blocks from a given message using the specified number of blocks.
         """
-        source_long, source_short = partition_bytes(message, num_blocks)
-        source = equalize_block_lengths(source_long, source_short)
-        return raptor_intermediate_blocks(source)
+        return raptor_intermediate_blocks(self.generate_source_blocks(message, num_blocks))
 
     def pick_indices(self, code_block_index):
         """
         Choose a set of indices for the provided CodeBlock index value.
         """
-        return find_lt_indices(self.source_blocks, code_block_index)
+        return find_lt_indices(self.source_blocks, code_block_index, raptor_params(self.source_blocks))
+
+    def new_encoder(self, message):
+        """
+        Create a new RaptorEncoder for a given message.
+        """
+        return RaptorEncoder(self, message)
 
-    def new_decoder(self, message_length):
+    def new_decoder(self, message_length, matrix_type='sparse'):
         """
         Create a new RaptorDecoder for a given message length.
         """
-        return RaptorDecoder(self, message_length)
+        return RaptorDecoder(self, message_length, matrix_type)
+
+class RaptorEncoder:
+    def __init__(self, codec, message):
+        """
+        Lazy encoder for one message. The source symbols are split once, the intermediate
+        symbols are computed once, when the first repair symbol is asked for, and encoding
+        symbols are generated only as they are consumed.
+        """
+        self.codec = codec
+        self.message = message
+        self.source = codec.generate_source_blocks(message, codec.source_blocks)
+        self.intermediate = None
+
+    def symbol(self, esi):
+        """
+        The encoding symbol with the given ESI.
+        """
+        return next(self.symbols(esi, esi + 1))
+
+    def symbols(self, start=0, stop=None):
+        """
+        Yield the encoding symbols for ESIs start, ..., stop - 1 as LTBlocks, or without end
+        when `stop` is None. Repair symbols get their indices ENCODER_BATCH_SIZE at a time.
+        """
+        k = self.codec.source_blocks
+        esi = start
+        while stop is None or esi < stop:
+            if esi < k:
+                yield LTBlock(block_code=esi, data=self.source[esi].padded_data())
+                esi += 1
+                continue
+
+            if self.intermediate is None:
+                self.intermediate = self.codec.generate_intermediate_blocks(self.message, k)
+            end = esi + ENCODER_BATCH_SIZE if stop is None else min(esi + ENCODER_BATCH_SIZE, stop)
+            for block_id, indices in zip(range(esi, end), find_lt_indices_batch(k, range(esi, end), raptor_params(k))):
+                block = generate_luby_transform_block(self.intermediate, indices)
+                data = bytes(block.data) if isinstance(block.data, bytearray) else block.data
+                yield LTBlock(block_code=block_id, data=data)
+            esi = end
+
+    def repair_symbols(self, start=None):
+        """
+        An endless stream of repair symbols (ESI >= K), from `start` or from K.
+        """
+        k = self.codec.source_blocks
+        return self.symbols(k if start is None else max(start, k))
 
 # Create a new RaptorCodec instance
 def new_raptor_codec(source_blocks, alignment_size):
@@ -134,57 +413,170 @@ def new_raptor_codec(source_blocks, alignment_size):
     return RaptorCodec(source_blocks, alignment_size)
 
 class RaptorDecoder:
-    def __init__(self, codec, message_length):
+    def __init__(self, codec, message_length, matrix_type='sparse'):
+        """
+        `matrix_type` picks the row representation of the decoding matrix: 'sparse' keeps
+        sorted index lists, 'bits' switches long rows to int bitsets (see BitMatrix).
+        """
+        if matrix_type not in MATRIX_TYPES:
+            raise ValueError(f"Unknown matrix type {matrix_type!r}, expected one of {tuple(MATRIX_TYPES)}")
         self.codec = codec
         self.message_length = message_length
-        l, s, h = intermediate_symbols(codec.source_blocks)
+        l, _, _ = intermediate_symbols(codec.source_blocks)
 
-        # Initialize the sparse matrix used for decoding.
-        self.matrix = SparseMatrix()
-        self.matrix.coeff = [[] for _ in range(l)]
+        # Initialize the sparse matrix used for decoding with the pre-code constraints
+        self.matrix = MATRIX_TYPES[matrix_type]()
+        self.matrix.coeff = [self.matrix.pack_row(list(row)) for row in precode_rows(codec.source_blocks)]
         self.matrix.v = [Block() for _ in range(l)]
 
-        k = codec.source_blocks
-        compositions = [[] for _ in range(s)]
-
-        for i in range(k):
-            a = 1 + (int(math.floor(i / s)) % (s - 1))
-            b = i % s
-            compositions[b].append(i)
-            b = (b + a) % s
-            compositions[b].append(i)
-            b = (b + a) % s
-            compositions[b].append(i)
-        for i in range(s):
-            compositions[i].append(k + i)
-            self.matrix.add_equation(compositions[i], Block())
-
-        compositions = [[] for _ in range(h)]
-
-        hprime = int(math.ceil(h / 2))
-        m = build_gray_sequence(k + s, hprime)
-        for i in range(h):
-            for j in range(k + s):
-                if bit_set(m[j], i):
-                    compositions[i].append(j)
-            compositions[i].append(k + s + i)
-            self.matrix.add_equation(compositions[i], Block())
+        # Source symbols received (ESI < K), kept out of the matrix until a repair symbol
+        # arrives: if all K of them come in, no elimination is needed at all
+        self.source = {}
+        self.source_in_matrix = False
 
     def add_blocks(self, blocks):
+        """
+        Add received encoding symbols. The index sets of the symbols that reach the matrix
+        are generated together, DECODER_BATCH_SIZE at a time, by `find_lt_indices_batch`,
+        so pass many blocks per call when ingesting a burst.
+        """
+        k = self.codec.source_blocks
+        equations = []
         for block in blocks:
-            indices = find_lt_indices(self.codec.source_blocks, block.block_code)
-            self.matrix.add_equation(indices, Block(data=block.data))
-        return self.matrix.determined()
+            if block.block_code < k:
+                if block.block_code in self.source:
+                    continue
+                self.source[block.block_code] = block.data
+                if not self.source_in_matrix:
+                    continue
+            elif not self.source_in_matrix:
+                self.source_in_matrix = True
+                equations.extend(self.source.items())
+            equations.append((block.block_code, block.data))
+        self._add_equations(equations)
+        return self.determined()
+
+    def _add_equations(self, equations):
+        k = self.codec.source_blocks
+        params = raptor_params(k)
+        for start in range(0, len(equations), DECODER_BATCH_SIZE):
+            batch = equations[start:start + DECODER_BATCH_SIZE]
+            if len(batch) == 1:
+                all_indices = [find_lt_indices(k, batch[0][0], params)]
+            else:
+                all_indices = find_lt_indices_batch(k, [block_code for block_code, _ in batch], params)
+            for (_, data), indices in zip(batch, all_indices):
+                # Rows are XORed in place: never hand the matrix a mutable buffer we keep
+                if isinstance(data, bytearray):
+                    data = bytes(data)
+                elif isinstance(data, list):
+                    data = list(data)
+                self.matrix.add_equation(indices, Block(data=data))
+
+    def determined(self):
+        return len(self.source) == self.codec.source_blocks or self.matrix.determined()
+
+    def save_state(self, path):
+        """
+        Checkpoint the decoder to `path`, so a transfer can resume after a restart with
+        `load_state` without receiving the same blocks again. The sparse matrix is stored
+        as little-endian int64 arrays (row offsets and column indices, then per-row data
+        offsets, paddings and data kinds), the source symbols held back for the
+        systematic fast path (ESIs, data offsets and kinds), then the row data and the
+        source symbol data. The file is written alongside `path` and renamed over it, so
+        a crash never leaves it torn.
+        """
+        coeff, v = self.matrix.coeff, self.matrix.v
+        row_offsets = array('q', [0])
+        columns = array('q')
+        for i in range(len(coeff)):
+            columns.extend(self.matrix.row_indices(i))
+            row_offsets.append(len(columns))
+
+        data_offsets, kinds, data = _pack_data([block.data for block in v])
+        paddings = array('q', [block.padding for block in v])
+        source_codes = array('q', self.source.keys())
+        source_offsets, source_kinds, source_data = _pack_data(self.source.values())
+
+        sections = [row_offsets, columns, data_offsets, paddings, kinds, source_codes, source_offsets, source_kinds]
+        if sys.byteorder != 'little':
+            for section in sections:
+                section.byteswap()
+
+        tmp = '%s.tmp%d' % (path, os.getpid())
+        with open(tmp, 'wb') as f:
+            f.write(pack(_STATE_HEADER, STATE_MAGIC, STATE_VERSION, self.codec.source_blocks,
+                         self.codec.symbol_size, self.message_length, len(coeff), len(columns), len(data),
+                         len(source_codes), len(source_data), self.source_in_matrix))
+            for section in sections:
+                section.tofile(f)
+            f.write(data)
+            f.write(source_data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    @classmethod
+    def load_state(cls, path, matrix_type='sparse'):
+        """
+        Restore a decoder checkpointed with `save_state`, into a `matrix_type` matrix.
+        """
+        with open(path, 'rb') as f:
+            header = f.read(calcsize(_STATE_HEADER))
+            (magic, version, k, symbol_size, message_length, l, num_columns, num_bytes,
+             num_source, num_source_bytes, source_in_matrix) = unpack_from(_STATE_HEADER, header)
+            if magic != STATE_MAGIC:
+                raise ValueError(f"{path} is not a Raptor decoder checkpoint")
+            if version != STATE_VERSION:
+                raise ValueError(f"Unsupported Raptor decoder checkpoint version {version}")
+
+            def section(typecode, count):
+                a = array(typecode)
+                a.fromfile(f, count)
+                if sys.byteorder != 'little':
+                    a.byteswap()
+                return a
+
+            row_offsets = section('q', l + 1)
+            columns = section('q', num_columns)
+            data_offsets = section('q', l + 1)
+            paddings = section('q', l)
+            kinds = section('B', l)
+            source_codes = section('q', num_source)
+            source_offsets = section('q', num_source + 1)
+            source_kinds = section('B', num_source)
+            data = f.read(num_bytes)
+            source_data = f.read(num_source_bytes)
+
+        # Skip __init__: the constraint rows are part of the saved matrix
+        decoder = cls.__new__(cls)
+        decoder.codec = RaptorCodec(k, symbol_size)
+        decoder.message_length = message_length
+        decoder.source = {code: _unpack_data(source_data, source_offsets, source_kinds, i)
+                          for i, code in enumerate(source_codes)}
+        decoder.source_in_matrix = bool(source_in_matrix)
+        decoder.matrix = MATRIX_TYPES[matrix_type]()
+        decoder.matrix.coeff = [decoder.matrix.pack_row(columns[row_offsets[i]:row_offsets[i + 1]].tolist())
+                                for i in range(l)]
+        decoder.matrix.v = []
+        for i in range(l):
+            decoder.matrix.v.append(Block(data=_unpack_data(data, data_offsets, kinds, i), padding=paddings[i]))
+        return decoder
 
     def decode(self):
-        if not self.matrix.determined():
+        if not self.determined():
             return None
 
-        self.matrix.reduce()
+        k = self.codec.source_blocks
+        if len(self.source) < k:
+            self.matrix.reduce()
 
-        # Use the encoder function to recover the source blocks.
-        intermediate = self.matrix.v
-        source = [lt_encode(self.codec.source_blocks, i, intermediate) for i in range(self.codec.source_blocks)]
+            # Use the encoder function to recover the missing source blocks.
+            intermediate = self.matrix.v
+            source = [Block(self.source[i]) if i in self.source else lt_encode(k, i, intermediate, raptor_params(k))
+                      for i in range(k)]
+        else:
+            source = [Block(self.source[i]) for i in range(k)]
 
         len_long, len_short, num_long, num_short = partition(self.message_length, self.codec.source_blocks)
         out = bytearray()
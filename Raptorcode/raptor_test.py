@@ -1,6 +1,9 @@
+import os
+import tempfile
 import unittest
 from utils import *
 from raptor import *
+from raptor import _intermediate_symbols
 from constants import *
 from luby import encode_lt_blocks
 
@@ -40,6 +43,15 @@ class TestRaptorCodec(unittest.TestCase):
             result = deg(x)
             self.assertEqual(result, expected_d, f"deg({x}) = {result}, should be {expected_d}")
 
+    def test_array_functions(self):
+        xs = np.array([random.randint(0, 1 << 20) for _ in range(500)] + [0, 255, 256, 65535])
+        for i, m in [(0, 1048576), (1, 8191), (2, 8293)]:
+            self.assertEqual(raptor_rand_array(xs, i, m).tolist(), [raptor_rand(int(x), i, m) for x in xs])
+        vs = np.array([0, 10240, 10241, 491581, 491582, 1048575] + [random.randint(0, 1048575) for _ in range(500)])
+        self.assertEqual(deg_array(vs).tolist(), [deg(int(v)) for v in vs])
+        d, a, b = triple_generator_array(1000, xs)
+        self.assertEqual(list(zip(d.tolist(), a.tolist(), b.tolist())), [triple_generator(1000, int(x)) for x in xs])
+
     def test_intermediate_symbols(self):
         intermediate_tests = [
             (0, 4, 2, 2),
@@ -55,6 +67,21 @@ class TestRaptorCodec(unittest.TestCase):
             self.assertEqual((l, s, h), (expected_l, expected_s, expected_h),
                              f"intermediateSymbols({k}) = ({l}, {s}, {h}), should be {expected_l}, {expected_s}, {expected_h}")
 
+    def test_intermediate_symbol_table(self):
+        for k in [1, 4, 13, 100, 1000, 4096, 8192] + [random.randint(1, 8192) for _ in range(50)]:
+            self.assertEqual(INTERMEDIATE_SYMBOL_TABLE[k], _intermediate_symbols(k),
+                             f"Table entry for K={k} differs from intermediateSymbols")
+        self.assertEqual(intermediate_symbols(9000), _intermediate_symbols(9000))
+        self.assertEqual(choose(40, 20), 137846528820)
+        self.assertEqual(center_binomial(7), 35)
+        self.assertEqual(center_binomial(15), 6435)
+
+        # Exact binomials: H is 16 from K = 6257 on (the old cancellation loop overestimated
+        # choose(15, 7) and gave H = 15 up to K = 8192)
+        self.assertEqual(intermediate_symbols(6256), (6450, 179, 15))
+        self.assertEqual(intermediate_symbols(6257), (6452, 179, 16))
+        self.assertEqual(intermediate_symbols(8192), (8419, 211, 16))
+
     def test_triple_generator(self):
         triple_tests = [
             (0, 3, 2, 4, 3),
@@ -87,6 +114,26 @@ class TestRaptorCodec(unittest.TestCase):
             self.assertEqual(indices, expected_indices,
                              f"findLTIndices({k}, {x}) = {indices}, should be {expected_indices}")
 
+    def test_prime_table(self):
+        for x, expected in [(0, 2), (2, 2), (14, 17), (1999, 1999), (2000, 2003), (8410, 8419)]:
+            self.assertEqual(smallest_prime_greater_or_equal(x), expected)
+        self.assertEqual(next_prime(17), 19)
+        self.assertEqual(smallest_prime_greater_or_equal(PRIME_TABLE_LIMIT), 16411)
+        self.assertLess(raptor_params(8192).lprime, PRIME_TABLE_LIMIT)
+
+    def test_raptor_params(self):
+        params = raptor_params(13)
+        self.assertIs(params, raptor_params(13))
+        self.assertEqual((params.l, params.s, params.h), intermediate_symbols(13))
+        self.assertEqual(params.lprime, 29)
+        self.assertEqual(params.j, systematicIndexTable[13])
+
+    def test_lt_indices_batch(self):
+        for k in [4, 13, 100, 1000]:
+            xs = list(range(50)) + [random.randint(0, 1 << 20) for _ in range(200)]
+            expected = [find_lt_indices(k, x) for x in xs]
+            self.assertEqual(find_lt_indices_batch(k, xs), expected, f"findLTIndicesBatch({k}) differs from findLTIndices")
+
     def test_raptor_decoder_construction(self):
         decoder = RaptorDecoder(RaptorCodec(alignment_size=1, source_blocks=10), 1)
         # Note: assuming print_matrix function is replaced with debug printing if necessary
@@ -199,6 +246,86 @@ class TestRaptorCodec(unittest.TestCase):
             # print("Recovered:\n", out)
             self.assertEqual(message, out, f"Decoding result must equal {message}, got {out}")
 
+    def test_raptor_codec_bit_matrix(self):
+        codec = RaptorCodec(13, 2)
+        message = b"abcdefghijklmnopqrstuvwxyz"
+        code_blocks = encode_lt_blocks(message, list(range(100, 130)), codec)
+
+        decoder = codec.new_decoder(len(message), matrix_type='bits')
+        self.assertTrue(decoder.add_blocks(code_blocks))
+        self.assertEqual(message, decoder.decode())
+
+    def test_systematic_fast_path(self):
+        codec = RaptorCodec(13, 2)
+        message = b"abcdefghijklmnopqrstuvwxy"
+        intermediate = codec.generate_intermediate_blocks(message, codec.source_blocks)
+        source_blocks = encode_lt_blocks(message, list(range(13)), codec)
+        for block in source_blocks:
+            expected = bytes(lt_encode(13, block.block_code, intermediate).data).ljust(2, b'\x00')
+            self.assertEqual(block.data, expected, f"Source symbol {block.block_code} is {block.data}, should be {expected}")
+
+        # All source symbols: decoded without touching the matrix
+        decoder = RaptorDecoder(codec, len(message))
+        self.assertTrue(decoder.add_blocks(source_blocks[::-1]))
+        self.assertFalse(decoder.source_in_matrix)
+        self.assertEqual(message, decoder.decode())
+
+        # Source symbols mixed with repair symbols
+        decoder = RaptorDecoder(codec, len(message))
+        decoder.add_blocks(source_blocks[:9])
+        self.assertFalse(decoder.determined())
+        decoder.add_blocks(encode_lt_blocks(message, list(range(13, 30)), codec))
+        self.assertTrue(decoder.determined())
+        self.assertEqual(message, decoder.decode())
+
+    def test_raptor_encoder(self):
+        codec = RaptorCodec(13, 2)
+        message = b"abcdefghijklmnopqrstuvwxyz"
+        encoder = codec.new_encoder(message)
+        expected = encode_lt_blocks(message, list(range(600)), codec)
+        self.assertEqual([(b.block_code, b.data) for b in encoder.symbols(0, 600)],
+                         [(b.block_code, b.data) for b in expected])
+        self.assertEqual(encoder.symbol(20).data, expected[20].data)
+
+        repair = encoder.repair_symbols()
+        blocks = [next(repair) for _ in range(20)]
+        self.assertEqual([b.block_code for b in blocks], list(range(13, 33)))
+        decoder = codec.new_decoder(len(message))
+        self.assertTrue(decoder.add_blocks(blocks))
+        self.assertEqual(message, decoder.decode())
+
+    def test_decoder_checkpoint(self):
+        codec = RaptorCodec(13, 2)
+        message = b"abcdefghijklmnopqrstuvwxyz"
+        code_blocks = encode_lt_blocks(message, list(range(30)), codec)
+
+        decoder = RaptorDecoder(codec, len(message))
+        decoder.add_blocks(code_blocks[:8])
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "decoder.state")
+            decoder.save_state(path)
+            restored = RaptorDecoder.load_state(path)
+
+        self.assertEqual(restored.matrix.coeff, decoder.matrix.coeff)
+        self.assertEqual([(b.data, b.padding) for b in restored.matrix.v],
+                         [(b.data, b.padding) for b in decoder.matrix.v])
+        self.assertTrue(restored.add_blocks(code_blocks[8:]))
+        self.assertEqual(message, restored.decode())
+
+        # Source symbols stay out of the matrix across a checkpoint, on both sides
+        decoder = RaptorDecoder(codec, len(message))
+        decoder.add_blocks(code_blocks[:9])
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "decoder.state")
+            decoder.save_state(path)
+            restored = RaptorDecoder.load_state(path)
+        for d in [decoder, restored]:
+            self.assertFalse(d.source_in_matrix)
+            self.assertEqual(d.source, {b.block_code: b.data for b in code_blocks[:9]})
+            self.assertTrue(d.add_blocks(code_blocks[9:13]))
+            self.assertFalse(d.source_in_matrix)
+            self.assertEqual(message, d.decode())
+
 
 if __name__ == "__main__":
     unittest.main()
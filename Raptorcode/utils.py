@@ -1,8 +1,13 @@
 import math
 import random
+from array import array
 from bisect import bisect_left
 from functools import lru_cache
-from Raptorcode.constants import *
+from Raptorcode import constants
+
+# smallest_prime_greater_or_equal looks primes below this up in a sieve; it covers L' for
+# every K up to 8192
+PRIME_TABLE_LIMIT = 1 << 14
 
 def soliton_distribution(n):
     cdf = [0.0] * (n + 1)
@@ -77,8 +82,7 @@ def factorial(x):
         result *= i
     return result
 
-import math
-
+@lru_cache(maxsize=None)
 def center_binomial(x):
     """
     Calculate choose(x, ceil(x/2)) = x! / (x/2)! / (x - (x/2))!
@@ -87,59 +91,75 @@ def center_binomial(x):
 
 def choose(n, k):
     """
-    Calculate the binomial coefficient "n choose k".
-    Handles large n/k values.
+    Calculate the binomial coefficient "n choose k", exactly.
     """
-    if k > n // 2:
-        k = n - k
-
-    numerator = list(range(k + 1, n + 1))
-    denominator = list(range(1, n - k + 1))
-
-    for j in range(len(denominator) - 1, -1, -1):
-        for i in range(len(numerator) - 1, -1, -1):
-            if numerator[i] % denominator[j] == 0:
-                numerator[i] //= denominator[j]
-                denominator[j] = 1
-                break
-
-    result = 1
-    for value in numerator:
-        result *= value
-    return result
+    return math.comb(n, k)
 
 def bit_set(x, b):
     return (x >> b) & 1 == 1
 
 def bits_set(x):
-    return bin(x).count('1')
+    return x.bit_count()
 
 def gray_code(x):
     return (x >> 1) ^ x
 
 def build_gray_sequence(length, b):
+    """
+    The first `length` Gray codes, in order, with exactly `b` bits set.
+    """
     seq = []
     x = 0
     while len(seq) < length:
-        g = gray_code(x)
-        if bits_set(g) == b:
+        # Codes below 2^(b-1) have fewer than b bits
+        if b and x < 1 << (b - 1):
+            x = 1 << (b - 1)
+        g = x ^ (x >> 1)
+        if g.bit_count() == b:
             seq.append(g)
         x += 1
     return seq
 
 
 def is_prime(x):
-    for p in smallPrimes:
+    for p in constants.smallPrimes:
         if p * p > x:
             return True
         if x % p == 0:
             return False
     return True
 
+@lru_cache(maxsize=None)
+def prime_table():
+    """
+    For every x < PRIME_TABLE_LIMIT, the smallest prime >= x, or 0 past the last prime
+    below the limit. Built by a sieve of Eratosthenes on first use.
+    """
+    sieve = bytearray([1]) * PRIME_TABLE_LIMIT
+    sieve[:2] = b'\x00\x00'
+    for p in range(2, math.isqrt(PRIME_TABLE_LIMIT - 1) + 1):
+        if sieve[p]:
+            sieve[p * p::p] = bytes(len(range(p * p, PRIME_TABLE_LIMIT, p)))
+
+    table = array('I', bytes(4 * PRIME_TABLE_LIMIT))
+    prime = 0
+    for x in range(PRIME_TABLE_LIMIT - 1, -1, -1):
+        if sieve[x]:
+            prime = x
+        table[x] = prime
+    return table
+
 def smallest_prime_greater_or_equal(x):
-    if x <= smallPrimes[-1]:
-        idx = bisect_left(smallPrimes, x)
-        return smallPrimes[idx]
+    if 0 <= x < PRIME_TABLE_LIMIT:
+        prime = prime_table()[x]
+        if prime:
+            return prime
     while not is_prime(x):
         x += 1
     return x
+
+def next_prime(x):
+    """
+    The smallest prime greater than x.
+    """
+    return smallest_prime_greater_or_equal(x + 1)
@@ -10,11 +10,13 @@ from struct import unpack
 import csv
 
 def encode_FEC(filename, blocksize=256, max_blocks=10000):
-    blocks = []
+    # All blocks live in one buffer; each list entry is a zero-copy view of one packet.
+    # encode_batch XORs with whichever engine is faster for this blocksize
     with open(filename, 'rb') as f:
-        for block in encode.encoder(f, blocksize, 2067261, sampler.DEFAULT_C, sampler.DEFAULT_DELTA, max_blocks=max_blocks):
-            blocks.append(block)
-    return blocks
+        packets = encode.encode_batch(f, blocksize, 2067261, max_blocks, sampler.DEFAULT_C, sampler.DEFAULT_DELTA)
+    buffer = memoryview(packets.view(np.uint8))
+    packet_size = packets.itemsize
+    return [buffer[i:i + packet_size] for i in range(0, len(buffer), packet_size)]
 
 def decode_FEC(blocks, output_filename):
     with open(output_filename, 'wb') as out_f:
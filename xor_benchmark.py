@@ -0,0 +1,39 @@
+import csv
+import sys
+import time
+from LTcode.lt import encode
+
+def time_engine(filename, blocksize, max_blocks, engine, repetitions):
+    # Best of `repetitions` runs, so that one slow run doesn't skew the comparison
+    best = None
+    for _ in range(repetitions):
+        with open(filename, 'rb') as f:
+            start = time.time()
+            if engine == 'batch':
+                encode.encode_batch(f, blocksize, 2067261, max_blocks).tobytes()
+            else:
+                b''.join(encode.encoder(f, blocksize, seed=2067261, max_blocks=max_blocks, backend=engine))
+            elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main():
+    # Configuration
+    file = sys.argv[1] if len(sys.argv) > 1 else "benchmark/input_files/data4"
+    max_blocks = 20000
+    block_sizes = [64, 256, 512, 1024, 2048, 4096, 8192]
+    engines = ['int', 'numpy', 'batch']
+    repetitions = 3
+    csv_file = "benchmark/xor_engine_times.csv"
+
+    with open(csv_file, mode="w", newline="") as out:
+        writer = csv.writer(out)
+        writer.writerow(["File", "Num Blocks", "Block Size"] + ["%s (s)" % engine for engine in engines])
+        for block_size in block_sizes:
+            times = [time_engine(file, block_size, max_blocks, engine, repetitions) for engine in engines]
+            print(f"File: {file}, Num Blocks: {max_blocks}, Block Size: {block_size}, " +
+                  ", ".join(f"{engine}: {t:.2f}s" for engine, t in zip(engines, times)))
+            writer.writerow([file, max_blocks, block_size] + times)
+
+if __name__ == "__main__":
+    main()